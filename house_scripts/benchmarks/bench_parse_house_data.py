@@ -0,0 +1,37 @@
+# 对比页面解析方式的耗时：原有的 BeautifulSoup 四次查找、单次正则扫描、lxml
+# 用法: python benchmarks/bench_parse_house_data.py [页面文件] [重复次数]
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import njhouse_stock
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'njhouse_stock.html')
+
+def run(html_path=FIXTURE_PATH, number=50):
+    with open(html_path, encoding='utf-8') as f:
+        html = f.read()
+
+    cases = {
+        'bs4 (原有方式)': lambda: njhouse_stock.parse_house_data_bs4(html),
+        'regex': lambda: njhouse_stock.parse_house_data(html, backend='regex'),
+        'lxml': lambda: njhouse_stock.parse_house_data(html, backend='lxml'),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+        results[name] = seconds
+        print(f"{name:<14} {seconds * 1000:8.3f} ms/次  {func()}")
+
+    baseline = results['bs4 (原有方式)']
+    for name, seconds in results.items():
+        print(f"{name:<14} 相对原有方式加速 {baseline / seconds:6.1f} 倍")
+    return results
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else FIXTURE_PATH
+    number = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run(path, number)
@@ -0,0 +1,252 @@
+# 基准测试：用 1、5、20 年的合成数据测试写入、清洗、绘图的耗时，以及页面解析和截图识别，结果写入 JSON
+# 用法: python benchmarks/bench_suite.py [--years 1,5,20] [--output 文件] [--compare 上次的结果文件]
+
+import os
+import sys
+import io
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmarks_dir))
+sys.path.insert(0, benchmarks_dir)
+
+import pandas as pd
+import njhouse_data
+import njhouse_stock
+import plot_output
+import plot_njhouse_stock
+import plot_njhouse_price_ratio
+import plot_downsample
+import njhouse_event_study
+import synthetic_data
+
+FIXTURES_DIR = os.path.join(benchmarks_dir, 'fixtures')
+RESULTS_DIR = os.path.join(benchmarks_dir, 'results')
+NEW_ROW = {'总挂牌房源': 125000, '中介挂牌房源': 120500, '个人挂牌房源': 4500, '昨日住宅成交量': 260}
+
+def measure(func, repeat, setup=None):
+    """运行 repeat 次，每次运行前调用 setup（不计时），返回每次的秒数；被测函数的输出不打印"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return times
+
+def result(name, times, **extra):
+    return {'name': name, **extra, 'repeat': len(times),
+            'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+
+@contextlib.contextmanager
+def stock_paths(csv_path, store_dir):
+    """临时将 njhouse_stock 的数据文件指向合成数据"""
+    saved = njhouse_stock.STOCK_CSV_PATH, njhouse_stock.STOCK_STORE_DIR
+    njhouse_stock.STOCK_CSV_PATH, njhouse_stock.STOCK_STORE_DIR = csv_path, store_dir
+    try:
+        yield
+    finally:
+        njhouse_stock.STOCK_CSV_PATH, njhouse_stock.STOCK_STORE_DIR = saved
+
+def bench_dataset(years, work_dir, repeat, plot_repeat):
+    paths = synthetic_data.generate(os.path.join(work_dir, 'source'), years)
+    csv_path = os.path.join(work_dir, 'njhouse_stock_daily.csv')
+    store_dir = os.path.join(work_dir, 'store')
+    rows = len(pd.read_csv(paths['stock'], encoding='utf-8-sig', usecols=['日期']))
+    tag = {'years': years, 'rows': rows}
+    results = []
+
+    def fresh_csv():
+        shutil.copy(paths['stock'], csv_path)
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    def fresh_store():
+        fresh_csv()
+        njhouse_stock.ensure_stock_store()
+
+    with stock_paths(csv_path, store_dir):
+        results.append(result('ensure_stock_store (从 CSV 初始化存储)',
+                              measure(njhouse_stock.ensure_stock_store, repeat, fresh_csv), **tag))
+        results.append(result('save_data_to_csv (新日期)',
+                              measure(lambda: njhouse_stock.save_data_to_csv(dict(NEW_ROW)), repeat, fresh_store), **tag))
+        # 上一项最后一次运行后，新日期已在存储中
+        results.append(result('save_data_to_csv (日期已存在)',
+                              measure(lambda: njhouse_stock.save_data_to_csv(dict(NEW_ROW)), repeat), **tag))
+
+    # 清洗：无重复日期时只读日期列；有重复时需要整体重写
+    results.append(result('clean_duplicate_data (无重复)',
+                          measure(lambda: njhouse_stock.clean_duplicate_data(csv_path), repeat), **tag))
+    duplicated = pd.read_csv(paths['stock'], encoding='utf-8-sig', dtype=str)
+    duplicated = pd.concat([duplicated.head(30), duplicated])
+
+    def add_duplicates():
+        duplicated.to_csv(csv_path, index=False, encoding='utf-8-sig')
+
+    results.append(result('clean_duplicate_data (有重复)',
+                          measure(lambda: njhouse_stock.clean_duplicate_data(csv_path), repeat, add_duplicates), **tag))
+
+    # 绘图：数据预先读取，只计算绘制和保存；每次都重新绘制，不使用按内容命名的跳过逻辑
+    stock_df = njhouse_data.load_stock(paths['stock'])
+    bk_df = njhouse_data.load_bk(paths['bk'])
+    policy_df = njhouse_data.load_policy(paths['policy'])
+    no_metrics = pd.DataFrame({'价格变动比': pd.Series(dtype='float64')}, index=pd.DatetimeIndex([]))
+    results.append(result('plot_total_listings',
+                          measure(lambda: plot_njhouse_stock.plot_total_listings(
+                              paths['stock'], df=stock_df, policy_df=policy_df), plot_repeat), **tag))
+    results.append(result('plot_price_change_ratio',
+                          measure(lambda: plot_njhouse_price_ratio.plot_price_change_ratio(
+                              paths['bk'], df=bk_df, policy_df=policy_df, metrics_df=no_metrics), plot_repeat), **tag))
+    # 从列式存储读取并降采样，耗时应基本不随年数增长
+    results.append(result('plot_total_listings_binned (auto)',
+                          measure(lambda: plot_njhouse_stock.plot_total_listings_binned(
+                              store_dir, policy_df=policy_df), plot_repeat), **tag))
+
+    # 政策事件研究：所有政策的窗口一次取出
+    days, values = plot_downsample.load_columns(store_dir, ['总挂牌房源', '昨日住宅成交量'])
+    series = {(njhouse_event_study.DEFAULT_CITY, column): (days, values[column]) for column in values}
+    events = njhouse_event_study.load_events(policy_df)
+    results.append(result('event_study', measure(lambda: njhouse_event_study.event_study(
+                              series, events, metrics=list(values)), repeat), policies=len(events), **tag))
+    return results
+
+def bench_parse(repeat):
+    with open(os.path.join(FIXTURES_DIR, 'njhouse_stock.html'), encoding='utf-8') as f:
+        html = f.read()
+    return [
+        result('parse_house_data (regex)', measure(lambda: njhouse_stock.parse_house_data(html), repeat * 20)),
+        result('parse_house_data_bs4 (原有方式)', measure(lambda: njhouse_stock.parse_house_data_bs4(html), repeat)),
+    ]
+
+def bench_ocr(repeat):
+    """
+    识别 fixtures 中的截图（bk_2024-12-04.png 为旧版标题栏布局，bk_2025-01-17.png 为新版布局），
+    没有截图或没有安装 tesseract 时跳过
+    """
+    images = sorted(path for ext in ('png', 'jpg', 'jpeg')
+                    for path in glob.glob(os.path.join(FIXTURES_DIR, f'*.{ext}')))
+    if not images:
+        return [{'name': 'ocr', 'skipped': 'fixtures 中没有截图'}]
+    if not shutil.which('tesseract'):
+        return [{'name': 'ocr', 'skipped': '未安装 tesseract'}]
+    import nj_bk_daily
+    import nj_bk_ocr
+
+    def clear_layout():
+        nj_bk_ocr._layout_cache.clear()
+
+    def extract_all():
+        for path in images:
+            nj_bk_daily.extract_data_from_image(path)
+
+    results = [
+        result('extract_data_from_image (无布局缓存)', measure(extract_all, repeat, clear_layout), images=len(images)),
+        result('extract_data_from_image (布局缓存命中)', measure(extract_all, repeat), images=len(images)),
+    ]
+
+    # 批量识别走多进程路径（ocr_images），结果缓存和布局缓存写到临时目录，每次运行前删除结果缓存
+    saved = nj_bk_daily.OCR_CACHE_PATH, nj_bk_daily.OCR_LAYOUT_PATH
+    with tempfile.TemporaryDirectory() as cache_dir:
+        nj_bk_daily.OCR_CACHE_PATH = os.path.join(cache_dir, 'ocr_cache.json')
+        nj_bk_daily.OCR_LAYOUT_PATH = os.path.join(cache_dir, 'ocr_layouts.json')
+
+        def clear_results(layouts=False):
+            clear_layout()
+            for path in [nj_bk_daily.OCR_CACHE_PATH] + ([nj_bk_daily.OCR_LAYOUT_PATH] if layouts else []):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        try:
+            results += [
+                result('ocr_images 多进程 (无布局缓存)',
+                       measure(lambda: nj_bk_daily.ocr_images(images), repeat, lambda: clear_results(layouts=True)),
+                       images=len(images)),
+                result('ocr_images 多进程 (已保存布局缓存)',
+                       measure(lambda: nj_bk_daily.ocr_images(images), repeat, clear_results),
+                       images=len(images)),
+            ]
+        finally:
+            nj_bk_daily.OCR_CACHE_PATH, nj_bk_daily.OCR_LAYOUT_PATH = saved
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=benchmarks_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(years_list=(1, 5, 20), repeat=5, plot_repeat=3):
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__,
+        },
+        'results': [],
+    }
+    output_root = plot_output.OUTPUT_ROOT
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 绘图输出写到临时目录，不影响仓库中的图片
+        plot_output.OUTPUT_ROOT = work_dir
+        try:
+            for years in years_list:
+                print(f"{years} 年数据...")
+                report['results'] += bench_dataset(years, os.path.join(work_dir, f'{years}y'), repeat, plot_repeat)
+            report['results'] += bench_parse(repeat)
+            report['results'] += bench_ocr(repeat)
+        finally:
+            plot_output.OUTPUT_ROOT = output_root
+    return report
+
+def _key(item):
+    return item['name'], item.get('years')
+
+def print_report(report, baseline=None):
+    previous = {_key(item): item for item in baseline['results']} if baseline else {}
+    for item in report['results']:
+        label = f"{item['name']}" + (f" [{item['years']} 年, {item['rows']} 行]" if 'years' in item else '')
+        if 'skipped' in item:
+            print(f"{label:<56} 跳过: {item['skipped']}")
+            continue
+        line = f"{label:<56} {item['median'] * 1000:10.2f} ms"
+        old = previous.get(_key(item))
+        if old and 'median' in old:
+            line += f"  对比上次 {item['median'] / old['median']:6.2f} 倍"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='运行基准测试并输出 JSON 结果')
+    parser.add_argument('--years', default='1,5,20', help='合成数据的年数，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每项的重复次数')
+    parser.add_argument('--plot-repeat', type=int, default=3, help='绘图的重复次数')
+    parser.add_argument('--output', default=None, help='结果文件，默认写入 benchmarks/results/')
+    parser.add_argument('--compare', default=None, help='与之前的结果文件对比')
+    args = parser.parse_args()
+
+    report = run([float(y) if '.' in y else int(y) for y in args.years.split(',')], args.repeat, args.plot_repeat)
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"\n结果已写入 {output}")
@@ -0,0 +1,77 @@
+# 生成与仓库中格式相同的合成数据：挂牌房源、贝壳每日数据、政策，用于测试数据量增长后的耗时
+# 用法: python benchmarks/synthetic_data.py 输出目录 [年数]
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+def _dates(years, end):
+    end = pd.Timestamp(end).normalize()
+    return pd.date_range(end=end, periods=int(years * 365), freq='D')
+
+def _newest_first(df):
+    df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
+    return df.iloc[::-1].reset_index(drop=True)
+
+def stock_frame(years, end, rng):
+    dates = _dates(years, end)
+    n = len(dates)
+    total = 120000 + np.cumsum(rng.normal(0, 150, n)).astype(int)
+    personal = rng.integers(4000, 5000, n)
+    weekend = dates.dayofweek >= 5
+    volume = np.where(weekend, rng.integers(0, 40, n), rng.integers(150, 400, n))
+    df = pd.DataFrame({
+        '总挂牌房源': total,
+        '中介挂牌房源': total - personal,
+        '个人挂牌房源': personal,
+        '昨日住宅成交量': volume,
+        '日期': dates,
+        '周几': [WEEKDAY_NAMES[d] for d in dates.dayofweek],
+    })
+    return _newest_first(df)
+
+def bk_frame(years, end, rng):
+    dates = _dates(years, end)
+    n = len(dates)
+    df = pd.DataFrame({
+        '成交量': rng.integers(40, 120, n),
+        '涨价房源': rng.integers(20, 100, n),
+        '降价房源': rng.integers(300, 900, n),
+        '日期': dates,
+        '周几': [WEEKDAY_NAMES[d] for d in dates.dayofweek],
+    })
+    return _newest_first(df)
+
+def policy_frame(years, end, rng):
+    # 大约每两个月一条政策
+    dates = _dates(years, end)
+    picked = np.sort(rng.choice(len(dates), size=max(1, len(dates) // 60), replace=False))
+    return pd.DataFrame({
+        '日期': dates[picked].strftime('%Y-%m-%d'),
+        '政策': [f'政策{i + 1}' for i in range(len(picked))],
+        '具体内容': [f'合成政策说明{i + 1}' for i in range(len(picked))],
+    }).iloc[::-1]
+
+def generate(out_dir, years, end=None, seed=0):
+    """在 out_dir 中生成 years 年的数据，默认截止到前天（每日任务写入昨天的数据时为新日期），返回各文件路径"""
+    end = end or pd.Timestamp.now().normalize() - pd.Timedelta(days=2)
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        'stock': os.path.join(out_dir, 'njhouse_stock_daily.csv'),
+        'bk': os.path.join(out_dir, 'njhouse_bk_daily.csv'),
+        'policy': os.path.join(out_dir, 'njhouse_policy.csv'),
+    }
+    stock_frame(years, end, rng).to_csv(paths['stock'], index=False, encoding='utf-8-sig')
+    bk_frame(years, end, rng).to_csv(paths['bk'], index=False, encoding='utf-8-sig')
+    policy_frame(years, end, rng).to_csv(paths['policy'], index=False, encoding='utf-8-sig')
+    return paths
+
+if __name__ == "__main__":
+    out_dir = sys.argv[1]
+    years = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+    for name, path in generate(out_dir, years).items():
+        print(f"{name}: {path}")
@@ -1,12 +1,35 @@
 # 每日任务
 
-import subprocess
 import os
-import sys
+import njhouse_data
+import plot_output
+import njhouse_stock
+import send_notification
+import pipeline_trace
+from daily_pipeline import run_pipeline
+
+# 指标、提醒和绘图模块（pandas、matplotlib）在各自的步骤中才导入，缩短启动时间
 
-# 切换到脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
+
+BK_CSV_PATH = njhouse_data.BK_CSV_PATH
+BK_METRICS_CSV_PATH = njhouse_data.BK_METRICS_CSV_PATH
+POLICY_CSV_PATH = njhouse_data.POLICY_CSV_PATH
+
+# 图片命名方式：hash 按数据内容命名，内容不变时不重复生成；timestamp 每次按时间戳生成新图片
+PLOT_NAMING = os.getenv('PLOT_NAMING', 'hash')
+# 每类图表保留的图片数量，更早的图片会被删除
+PLOT_RETENTION = int(os.getenv('PLOT_RETENTION', '30'))
+# 图表输出方式，逗号分隔：png 为 README 中的图片，web 为网页版图表的数据文件；只输出 web 时不运行 matplotlib
+CHART_OUTPUT = [name for name in os.getenv('CHART_OUTPUT', 'png,web').split(',') if name]
+# 任务结束时等待通知发送的最长时间（秒）
+NOTIFY_WAIT_SECONDS = 30
+# 需要性能分析的步骤，逗号分隔，all 为全部步骤；分析工具为 cprofile 或 pyinstrument
+PIPELINE_PROFILE = [name for name in os.getenv('PIPELINE_PROFILE', '').split(',') if name]
+PIPELINE_PROFILER = os.getenv('PIPELINE_PROFILER', 'cprofile')
+
+def record_image(image_path):
+    pipeline_trace.record('image', path=image_path, bytes=os.path.getsize(plot_output.resolve(image_path)))
 
 def update_readme(bk_image_path, stock_image_path):
     """更新 README.md 中的图片链接"""
@@ -38,63 +61,126 @@ def update_readme(bk_image_path, stock_image_path):
         f.write(readme_content)
     
     print('README.md 更新成功')
-    
-    # 调用发送通知脚本
-    try:
-        subprocess.run([sys.executable, 'send_notification.py'], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f'Failed to send notification: {str(e)}')
+
+def fetch_stock_data():
+    """抓取南京房产数据并保存，返回 CSV 路径"""
+    print('\n开始执行南京房产数据抓取任务...')
+    result = njhouse_stock.get_house_data()
+    if not isinstance(result, dict):
+        raise RuntimeError(result)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    csv_path = njhouse_stock.save_data_to_csv(result)
+    if not csv_path:
+        raise RuntimeError('数据保存失败')
+    print('南京房产数据抓取任务执行成功')
+    return csv_path
+
+def update_stock_metrics(csv_path):
+    import njhouse_metrics
+    added = njhouse_metrics.update_stock_metrics()
+    print(f'挂牌房源派生指标已更新，新增 {added} 天')
+    return added
+
+def update_bk_metrics():
+    import njhouse_metrics
+    added = njhouse_metrics.update_bk_metrics(BK_CSV_PATH)
+    print(f'贝壳数据派生指标已更新，新增 {added} 天')
+    return added
+
+def check_alerts(stream):
+    """检查一种数据（stock 或 bk）的新数据是否触发提醒规则，返回提醒正文，没有提醒时返回 None"""
+    import njhouse_alerts
+    alerts = njhouse_alerts.check_new_rows(streams=[stream])
+    if not alerts:
+        print(f'{stream} 数据没有触发提醒')
+        return None
+    body = njhouse_alerts.format_alerts(alerts)
+    print(f'触发提醒：\n{body}')
+    return body
+
+def notify(*alert_bodies):
+    """在后台发送每日通知，触发的提醒写在通知正文中"""
+    body = '\n'.join(body for body in alert_bodies if body) or None
+    return send_notification.send_notification_async(body=body)
+
+def plot_stock(csv_path):
+    import plot_njhouse_stock
+    print('\n开始执行总房源图表绘制...')
+    image_path = plot_output.cached_render(
+        'plot_njhouse_total_listings',
+        [csv_path, POLICY_CSV_PATH],
+        plot_njhouse_stock.render_settings(),
+        lambda: plot_njhouse_stock.plot_total_listings(csv_path, naming=PLOT_NAMING, retention=PLOT_RETENTION))
+    print('总房源图表绘制成功')
+    record_image(image_path)
+    return image_path
+
+def plot_bk(metrics_added=None):
+    import plot_njhouse_price_ratio
+    print('\n开始执行房价比例图表绘制...')
+    image_path = plot_output.cached_render(
+        'plot_njhouse_bk_daily',
+        [BK_CSV_PATH, POLICY_CSV_PATH, BK_METRICS_CSV_PATH],
+        plot_njhouse_price_ratio.render_settings(),
+        lambda: plot_njhouse_price_ratio.plot_price_change_ratio(BK_CSV_PATH, naming=PLOT_NAMING, retention=PLOT_RETENTION))
+    print('房价比例图表绘制成功')
+    record_image(image_path)
+    return image_path
+
+def export_web(csv_path, metrics_added=None):
+    import plot_web
+    print('\n开始导出网页版图表数据...')
+    return plot_web.export_bundle()
 
 def run_scripts():
-    # 检查必要的环境变量
-    required_keys = ['BARK_SECRET_KEY', 'BARK_SECRET_KEY_TINA']
-    missing_keys = [key for key in required_keys if not os.getenv(key)]
+    # 检查通知接收人配置
+    if not send_notification.load_recipients():
+        print('警告：未找到 Bark 密钥，请设置 BARK_SECRET_KEYS 或 BARK_SECRET_KEY* 环境变量')
     
-    if missing_keys:
-        print(f'警告：未找到以下环境变量: {", ".join(missing_keys)}')
-    
-    bk_image_path = None
-    stock_image_path = None
-    
-    # 1. 执行数据抓取脚本
-    try:
-        print('\n开始执行南京房产数据抓取任务...')
-        subprocess.run([sys.executable, 'njhouse_stock.py'], check=True)
-        print('南京房产数据抓取任务执行成功')
+    # 所有步骤在同一进程内执行，数据集由 njhouse_data 统一读取，渲染缓存命中时不会读取；
+    # 两个图表互不依赖，会并发绘制
+    steps = {
+        'fetch': (fetch_stock_data, []),
+        'stock_metrics': (update_stock_metrics, ['fetch']),
+        'bk_metrics': (update_bk_metrics, []),
+        # 两种数据的提醒分别检查，抓取失败时贝壳数据的提醒仍然会发出
+        'stock_alerts': (lambda _: check_alerts('stock'), ['stock_metrics']),
+        'bk_alerts': (lambda _: check_alerts('bk'), ['bk_metrics']),
+    }
+    if 'png' in CHART_OUTPUT:
+        steps['plot_stock'] = (plot_stock, ['fetch'])
+        steps['plot_bk'] = (plot_bk, ['bk_metrics'])
+        steps['update_readme'] = (update_readme, ['plot_bk', 'plot_stock'])
+    if 'web' in CHART_OUTPUT:
+        steps['export_web'] = (export_web, ['fetch', 'bk_metrics'])
+    # 通知在后台线程中发送，不阻塞后续步骤；提醒写在通知正文中
+    steps['notify'] = (lambda _, *alerts: notify(*alerts),
+                       ['update_readme' if 'png' in CHART_OUTPUT else 'export_web', 'stock_alerts', 'bk_alerts'])
+    # 各步骤的耗时、内存、读写量和请求延迟追加到性能记录文件，通知发送完成后才写入
+    with pipeline_trace.Tracer(profile=PIPELINE_PROFILE, profiler=PIPELINE_PROFILER) as tracer:
+        results = run_pipeline(steps, tracer=tracer)
+        
+        # 汇总各图表的渲染缓存命中情况
+        for chart, status in plot_output.render_stats.items():
+            print(f'{chart}: 渲染缓存{"命中" if status == "hit" else "未命中"}')
+            tracer.emit('render_cache', chart=chart, status=status)
+        
+        if 'notify' in results:
+            print('\n所有任务执行完成！')
+        else:
+            # 部分步骤失败时不发送每日通知，但已经检查出的提醒仍然发出
+            alerts = [results.get(name) for name in ('stock_alerts', 'bk_alerts')]
+            if any(alerts):
+                print('\n部分任务执行失败，只发送提醒')
+                results['notify'] = notify(*alerts)
         
-        # 2. 数据抓取成功后，执行总房源图表绘制
-        try:
-            print('\n开始执行总房源图表绘制...')
-            result = subprocess.run([sys.executable, 'plot_njhouse_stock.py'], 
-                                 capture_output=True, 
-                                 text=True,
-                                 check=True)
-            stock_image_path = result.stdout.strip().split('图表已保存为 ')[-1]
-            print('总房源图表绘制成功')
-            
-            # 3. 执行房价比例图表绘制
-            try:
-                print('\n开始执行房价比例图表绘制...')
-                result = subprocess.run([sys.executable, 'plot_njhouse_price_ratio.py'],
-                                     capture_output=True,
-                                     text=True,
-                                     check=True)
-                bk_image_path = result.stdout.strip().split('折线图已保存为 ')[-1]
-                print('房价比例图表绘制成功')
-                
-                # 4. 更新 README.md
-                if bk_image_path and stock_image_path:
-                    update_readme(bk_image_path, stock_image_path)
-                
-                print('\n所有任务执行完成！')
-            except subprocess.CalledProcessError as e:
-                print(f'房价比例图表绘制失败: {str(e)}')
-                
-        except subprocess.CalledProcessError as e:
-            print(f'总房源图表绘制失败: {str(e)}')
-            
-    except subprocess.CalledProcessError as e:
-        print(f'南京房产数据抓取任务执行失败: {str(e)}')
+        # 退出前最多等待通知发送一段时间，慢的接收人不会拖住整个任务
+        thread = results.get('notify')
+        if thread is not None:
+            thread.join(timeout=NOTIFY_WAIT_SECONDS)
+            if thread.is_alive():
+                print(f'通知在 {NOTIFY_WAIT_SECONDS} 秒内未全部发送完成，不再等待')
 
 if __name__ == "__main__":
     run_scripts()
@@ -0,0 +1,57 @@
+# 进程内的每日任务流水线：按依赖关系执行各步骤，步骤之间通过返回值传递数据
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def run_pipeline(steps, max_workers=4, tracer=None):
+    """
+    执行流水线并返回各步骤的结果
+    steps: {步骤名: (函数, [依赖的步骤名])}，函数按依赖顺序接收依赖步骤的返回值
+    相互独立的步骤会并发执行，某一步失败时跳过所有依赖它的步骤
+    tracer 为 pipeline_trace.Tracer 时记录每个步骤的耗时等数据
+    """
+    pending = dict(steps)
+    results = {}
+    failed = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # 跳过依赖失败的步骤，直到没有新的步骤被跳过
+            skipped = True
+            while skipped:
+                skipped = False
+                for name, (func, deps) in list(pending.items()):
+                    if any(dep in failed for dep in deps):
+                        print(f'跳过步骤 {name}：依赖的步骤执行失败')
+                        if tracer is not None:
+                            tracer.emit('stage', stage=name, status='skipped')
+                        failed.add(name)
+                        del pending[name]
+                        skipped = True
+
+            # 提交所有依赖已完成的步骤
+            for name, (func, deps) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    args = [results[dep] for dep in deps]
+                    if tracer is not None:
+                        future = executor.submit(tracer.run_stage, name, func, *args)
+                    else:
+                        future = executor.submit(func, *args)
+                    running[future] = name
+                    del pending[name]
+
+            if not running:
+                if pending:
+                    print(f'以下步骤的依赖无法满足: {", ".join(pending)}')
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f'步骤 {name} 执行失败: {str(e)}')
+                    failed.add(name)
+
+    return results
@@ -0,0 +1,193 @@
+# 数据源插件：每个城市的每个数据源实现 schema / fetch / parse，由调度器并发采集，
+# 结果写入按 城市/数据源 分区的列式存储
+# 用法: python house_sources.py [城市/数据源 ...] [--workers N] [--list]
+
+import os
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import njhouse_fetch
+import njhouse_stock
+import njhouse_store
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+# 已注册的数据源类，键为 "城市/数据源"
+SOURCES = {}
+
+def register(cls):
+    """注册数据源类的装饰器，新增城市或数据源时只需定义子类并加上该装饰器"""
+    SOURCES[f'{cls.city}/{cls.name}'] = cls
+    return cls
+
+class RateLimiter:
+    """保证两次请求之间至少间隔 min_interval 秒，可被多个线程共用"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+class Source:
+    """
+    数据源插件的基类
+    city / name 决定写入的存储分区；min_interval 为两次请求之间的最小间隔（秒），
+    rate_key 相同的数据源（如同一网站的不同城市页面）共用一个限速器
+    """
+    city = None
+    name = None
+    min_interval = 0.0
+
+    @property
+    def key(self):
+        return f'{self.city}/{self.name}'
+
+    @property
+    def rate_key(self):
+        return self.key
+
+    def schema(self):
+        """存储的列定义，格式同 njhouse_store.STOCK_SCHEMA，第一列为日期"""
+        raise NotImplementedError
+
+    def fetch(self, throttle):
+        """获取原始数据，每次发出请求前需调用 throttle()"""
+        raise NotImplementedError
+
+    def parse(self, raw):
+        """将 fetch 的结果解析为多行数据，每行是包含 '日期' 的字典"""
+        raise NotImplementedError
+
+    def export(self, store_dir):
+        """数据写入存储后调用，可用于导出 CSV，默认不做任何事"""
+
+@register
+class NjhouseStockSource(Source):
+    """南京网上房地产的挂牌房源页面，页面数据记为抓取时间的前一天"""
+    city = 'nanjing'
+    name = 'njhouse_stock'
+    min_interval = 2.0
+    url = njhouse_stock.STOCK_URL
+    csv_path = njhouse_stock.STOCK_CSV_PATH
+
+    @property
+    def rate_key(self):
+        return self.url.split('/')[2]
+
+    def schema(self):
+        return njhouse_store.STOCK_SCHEMA
+
+    def fetch(self, throttle):
+        throttle()
+        fetched_at = datetime.now(BEIJING_TZ)
+        page = njhouse_fetch.fetch_pages([self.url], concurrency=1)[self.url]
+        if isinstance(page, Exception):
+            raise page
+        return fetched_at, page
+
+    def parse(self, raw):
+        fetched_at, html = raw
+        data = njhouse_stock.parse_house_data(html)
+        if all(value is None for value in data.values()):
+            return []
+        data['日期'] = (fetched_at - timedelta(days=1)).strftime('%Y-%m-%d')
+        return [data]
+
+    def export(self, store_dir):
+        if self.csv_path:
+            njhouse_store.export_csv(store_dir, self.csv_path)
+
+@register
+class BeikeOcrSource(Source):
+    """贝壳每日数据截图，每天只识别一张截图，已识别过的图片使用 OCR 缓存"""
+    city = 'nanjing'
+    name = 'beike_ocr'
+    # 为空时使用 nj_bk_daily.PICTURES_DIR
+    image_dir = None
+    max_workers = None
+
+    def schema(self):
+        return njhouse_store.BK_OCR_SCHEMA
+
+    def fetch(self, throttle):
+        # OCR 依赖 tesseract，只在用到该数据源时导入
+        import nj_bk_daily
+        image_dir = self.image_dir or nj_bk_daily.PICTURES_DIR
+        if not os.path.isdir(image_dir):
+            print(f"截图目录 {image_dir} 不存在，跳过")
+            return []
+        # 同一天的多张截图只识别一张
+        return nj_bk_daily.intake_images(nj_bk_daily.list_images(image_dir))
+
+    def parse(self, raw):
+        if not raw:
+            return []
+        import nj_bk_daily
+        return nj_bk_daily.ocr_rows(raw, self.max_workers)
+
+def run_source(source, store_root, throttle):
+    """采集单个数据源并写入其分区，返回新增的行数"""
+    rows = source.parse(source.fetch(throttle))
+    store_dir = njhouse_store.partition_dir(store_root, source.city, source.name)
+    if not njhouse_store.store_exists(store_dir):
+        njhouse_store.create_store(store_dir, source.schema())
+    added = njhouse_store.merge_rows(store_dir, rows) if rows else 0
+    source.export(store_dir)
+    return added
+
+def collect(sources=None, store_root=njhouse_stock.STORE_ROOT, max_workers=4):
+    """
+    并发采集所有数据源，默认为全部已注册的数据源
+    返回 {城市/数据源: 新增行数或异常}，单个数据源失败不影响其他数据源
+    """
+    if sources is None:
+        sources = [cls() for cls in SOURCES.values()]
+    # 同一分区只采集一次，避免并发写入同一存储
+    sources = list({source.key: source for source in sources}.values())
+
+    # 共用限速器的数据源取其中最长的间隔
+    intervals = {}
+    for source in sources:
+        intervals[source.rate_key] = max(intervals.get(source.rate_key, 0.0), source.min_interval)
+    limiters = {key: RateLimiter(interval) for key, interval in intervals.items()}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_source, source, store_root, limiters[source.rate_key].wait): source
+                   for source in sources}
+        for future in as_completed(futures):
+            key = futures[future].key
+            try:
+                results[key] = future.result()
+                print(f"{key}: 新增 {results[key]} 行")
+            except Exception as e:
+                results[key] = e
+                print(f"{key}: 采集失败 {str(e)}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='并发采集所有已注册的数据源')
+    parser.add_argument('sources', nargs='*', help='要采集的数据源（城市/数据源），默认全部')
+    parser.add_argument('--workers', type=int, default=4, help='同时采集的数据源数量')
+    parser.add_argument('--list', action='store_true', help='列出已注册的数据源')
+    args = parser.parse_args()
+
+    if args.list:
+        for key, cls in SOURCES.items():
+            print(f"{key}: {cls.__doc__}")
+    else:
+        unknown = [key for key in args.sources if key not in SOURCES]
+        if unknown:
+            parser.error(f"未注册的数据源: {', '.join(unknown)}")
+        selected = [SOURCES[key]() for key in args.sources] if args.sources else None
+        collect(selected, max_workers=args.workers)
@@ -1,15 +1,49 @@
 import os
+import sys
+import json
+import hashlib
 import pytesseract
+import nj_bk_ocr
+import njhouse_data
 from PIL import Image
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-# 切换到脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
+PICTURES_DIR = njhouse_data.PICTURES_DIR
+OCR_CSV_PATH = os.path.join(script_dir, 'njhouse_stock_daily', 'njhouse_bk_daily_ocr.csv')
+
+# OCR 结果缓存，按图片内容哈希索引；修改解析逻辑后递增版本号，旧结果会被重新识别
+OCR_CACHE_PATH = os.path.join(script_dir, 'njhouse_stock_daily', 'ocr_cache.json')
+OCR_PARSER_VERSION = 3
+# 截图卡片的布局缓存（标签和日期的位置），与 OCR 结果缓存放在一起，各进程和每次运行共用
+OCR_LAYOUT_PATH = os.path.join(script_dir, 'njhouse_stock_daily', 'ocr_layouts.json')
+OCR_COLUMNS = ['日期', '成交均价', '成交量', '新增挂牌', '涨价房源', '降价房源', '看房人数', '看房量', '成交周期']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# njhouse_bk_daily.csv 的列，与手工填写的格式一致
+BK_DAILY_COLUMNS = ['成交量', '涨价房源', '降价房源', '日期', '周几']
+WEEKDAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+def capture_date(image_path):
+    """截图日期：优先取文件名或 EXIF 中的时间，否则为文件的修改时间"""
+    import nj_bk_intake
+    taken = nj_bk_intake.capture_time(image_path)
+    if taken:
+        return datetime.fromisoformat(taken).date()
+    return datetime.fromtimestamp(os.path.getmtime(image_path)).date()
 
 def extract_data_from_image(image_path):
     try:
+        # 优先只识别数据卡片中的数字区域，速度快且能识别出全部字段
+        try:
+            data = nj_bk_ocr.extract_fields(image_path, capture_date(image_path))
+        except Exception as e:
+            print(f"区域识别失败，改为整图识别: {str(e)}")
+            data = {}
+        if data.get('日期') and len(data) > 1:
+            return {column: data.get(column) for column in OCR_COLUMNS}
+        
         # 使用pytesseract从图片中提取文字
         text = pytesseract.image_to_string(Image.open(image_path), lang='chi_sim')
         
@@ -32,42 +66,174 @@ def extract_data_from_image(image_path):
         return {
             '日期': date,
             '成交量': volume,
-            '涨价': price_increase,
-            '降价': price_decrease
+            '涨价房源': price_increase,
+            '降价房源': price_decrease
         }
     except Exception as e:
         print(f"从图片中提取数据时发生错误: {str(e)}")
         return None
 
 def save_data_to_csv(data, csv_path):
+    return save_rows_to_csv([data], csv_path)
+
+def save_rows_to_csv(rows, csv_path, columns=None):
+    """一次性写入多行数据，日期重复时以新数据为准，新数据在最上面"""
     try:
-        df_new = pd.DataFrame([data])
+        df_new = pd.DataFrame(rows, columns=columns)
         
-        # 如果文件存在，读取现有数据并将新数据放在最上面
+        # 如果文件存在，读取现有数据并与新数据合并
         if os.path.exists(csv_path):
-            df_existing = pd.read_csv(csv_path, encoding='utf-8-sig')
+            df_existing = pd.read_csv(csv_path, encoding='utf-8-sig', dtype=str)
             df_combined = pd.concat([df_new, df_existing], ignore_index=True)
-            df_combined.to_csv(csv_path, index=False, encoding='utf-8-sig')
         else:
-            # 如果文件不存在，直接创建新文件
-            df_new.to_csv(csv_path, index=False, encoding='utf-8-sig')
-            
+            df_combined = df_new
+        
+        df_combined = df_combined.drop_duplicates(subset=['日期'], keep='first')
+        df_combined = df_combined.sort_values('日期', ascending=False, kind='stable')
+        df_combined.to_csv(csv_path, index=False, encoding='utf-8-sig')
         return True
     except Exception as e:
         print(f"保存数据时发生错误: {str(e)}")
         return False
 
-def process_images_in_directory(directory_path, csv_path):
-    for filename in os.listdir(directory_path):
-        if filename.endswith('.png') or filename.endswith('.jpg'):
-            image_path = os.path.join(directory_path, filename)
-            data = extract_data_from_image(image_path)
-            if data:
-                save_data_to_csv(data, csv_path)
+def image_hash(image_path):
+    with open(image_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_ocr_cache():
+    try:
+        with open(OCR_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_ocr_cache(cache):
+    os.makedirs(os.path.dirname(OCR_CACHE_PATH), exist_ok=True)
+    with open(OCR_CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def load_layouts():
+    """读取保存的布局缓存，解析逻辑的版本变化后不再使用"""
+    try:
+        with open(OCR_LAYOUT_PATH, encoding='utf-8') as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return saved.get('layouts', {}) if saved.get('version') == OCR_PARSER_VERSION else {}
+
+def save_layouts(layouts):
+    os.makedirs(os.path.dirname(OCR_LAYOUT_PATH), exist_ok=True)
+    with open(OCR_LAYOUT_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'version': OCR_PARSER_VERSION, 'layouts': layouts}, f, ensure_ascii=False, indent=2)
+
+def _init_worker(layouts):
+    """进程池的初始化函数：工作进程启动时载入已知的布局"""
+    nj_bk_ocr.load_layouts(layouts)
+
+def _ocr_task(image_path):
+    """识别一张图片，同时返回该进程中的布局，供主进程合并保存"""
+    return extract_data_from_image(image_path), nj_bk_ocr.dump_layouts()
+
+def ocr_images(image_paths, max_workers=None):
+    """
+    多进程识别多张图片，已识别过的图片（按内容哈希）直接使用缓存结果，
+    各工作进程启动时载入保存的布局缓存，识别中新得到的布局在结束后合并保存，
+    返回 {图片路径: 识别结果}，识别失败的为 None
+    """
+    hashes = {path: image_hash(path) for path in image_paths}
+    
+    cache = load_ocr_cache()
+    todo = [path for path in image_paths
+            if cache.get(hashes[path], {}).get('version') != OCR_PARSER_VERSION]
+    print(f"共 {len(image_paths)} 张图片，需要识别 {len(todo)} 张，其余使用缓存结果")
+    
+    if todo:
+        layouts = load_layouts()
+        nj_bk_ocr.load_layouts(layouts)
+        learned = dict(layouts)
+        # 只有一张图片时（如常驻监视模式中新到的截图）直接在本进程识别，不启动进程池
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                       initargs=(layouts,)) if len(todo) > 1 else None
+        try:
+            results = executor.map(_ocr_task, todo) if executor else map(_ocr_task, todo)
+            for path, (data, worker_layouts) in zip(todo, results):
+                learned.update(worker_layouts)
+                # 识别出错的图片不写入缓存，下次运行时重试
+                if data is None:
+                    continue
+                cache[hashes[path]] = {
+                    'version': OCR_PARSER_VERSION,
+                    'file': os.path.basename(path),
+                    'data': data,
+                }
+        finally:
+            if executor:
+                executor.shutdown()
+        save_ocr_cache(cache)
+        if learned != layouts:
+            save_layouts(learned)
+    
+    return {path: cache.get(hashes[path], {}).get('data') for path in image_paths}
+
+def list_images(directory_path):
+    return [os.path.join(directory_path, filename)
+            for filename in sorted(os.listdir(directory_path))
+            if filename.lower().endswith(IMAGE_EXTENSIONS)]
+
+def intake_images(image_paths):
+    """识别前去重：同一天的多张截图及近似重复的副本只保留一张，返回保留的图片"""
+    import nj_bk_intake
+    hashes = {path: image_hash(path) for path in image_paths}
+    kept, _ = nj_bk_intake.select_images(image_paths, hashes)
+    return kept
+
+def ocr_rows(image_paths, max_workers=None):
+    """识别若干图片，返回识别出日期的结果，日期统一为 YYYY-MM-DD"""
+    rows = []
+    for path, data in ocr_images(image_paths, max_workers).items():
+        date = pd.to_datetime(data.get('日期') if data else None, errors='coerce')
+        if pd.isna(date):
+            print(f"未能从 {path} 中识别出日期，已跳过")
+            continue
+        # 统一日期格式，避免同一天因写法不同而重复写入
+        rows.append({**data, '日期': date.strftime('%Y-%m-%d')})
+    return rows
+
+def process_images_in_directory(directory_path, csv_path, max_workers=None, dedupe=True):
+    """识别目录中的图片（dedupe 为 True 时每天只识别一张），所有结果在最后一次性写入 CSV"""
+    image_paths = list_images(directory_path)
+    if dedupe:
+        image_paths = intake_images(image_paths)
+    rows = ocr_rows(image_paths, max_workers)
+    if rows:
+        save_rows_to_csv(rows, csv_path, columns=OCR_COLUMNS)
+    return rows
+
+def merge_into_bk_daily(rows, csv_path=njhouse_data.BK_CSV_PATH):
+    """
+    将识别结果追加到绘图使用的 njhouse_bk_daily.csv，只追加其中还没有的日期，已有（手工填写）的数据不覆盖
+    返回追加的行数
+    """
+    existing = pd.read_csv(csv_path, encoding='utf-8-sig', dtype=str) if os.path.exists(csv_path) else None
+    known = set(existing['日期']) if existing is not None else set()
+    new_rows = []
+    for row in rows:
+        if row['日期'] in known:
+            continue
+        known.add(row['日期'])
+        weekday = WEEKDAYS[datetime.strptime(row['日期'], '%Y-%m-%d').weekday()]
+        new_rows.append({**{column: row.get(column) for column in BK_DAILY_COLUMNS}, '日期': row['日期'], '周几': weekday})
+    if new_rows:
+        df = pd.DataFrame(new_rows, columns=BK_DAILY_COLUMNS)
+        if existing is not None:
+            df = pd.concat([df, existing], ignore_index=True)
+        df = df.sort_values('日期', ascending=False, kind='stable')
+        df.to_csv(csv_path, index=False, encoding='utf-8')
+    return len(new_rows)
 
 if __name__ == "__main__":
-    image_directory = 'nj_bk_daily_pictures'
-    csv_path = 'njhouse_stock_daily/njhouse_bk_daily.csv'
+    image_directory = sys.argv[1] if len(sys.argv) > 1 else PICTURES_DIR
+    csv_path = OCR_CSV_PATH
     
     # 确保目录存在
     if not os.path.exists(image_directory):
@@ -0,0 +1,180 @@
+# 截图入库前的去重：按感知哈希（dHash）找出近似重复的图片，从文件名或 EXIF 推断拍摄日期，
+# 每天只保留一张图片交给 OCR；可选将保留的图片转为灰度并缩小到识别尺寸后另存，减小归档体积
+# 用法: python nj_bk_intake.py 截图目录 [--threshold 8] [--archive 输出目录]
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+import cv2
+import nj_bk_ocr
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# 感知哈希的缓存，按图片内容的 sha256 索引；修改哈希或日期推断方式后递增版本号
+INTAKE_CACHE_PATH = os.path.join(script_dir, 'njhouse_stock_daily', 'intake_cache.json')
+INTAKE_VERSION = 1
+# dHash 的边长，哈希为 HASH_SIZE * HASH_SIZE 位；只对数据卡片计算，整张截图的哈希几乎不受数字变化影响
+HASH_SIZE = 32
+# 汉明距离不超过该值的两张图片视为近似重复（同一张截图转存、缩放后的副本）
+# 现有截图中，不同日期的卡片之间最少相差 19 位，副本经 JPEG 压缩或缩放后相差 3~17 位
+DUPLICATE_THRESHOLD = 8
+# 文件名中的日期时间，如 "截屏 2025-01-19 09.05.44"、"Screenshot 2024-12-04 at 10.11.08"
+FILENAME_DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})(?:\D{1,4}(\d{2})\.(\d{2})\.(\d{2}))?')
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+EXIF_IFD = 0x8769
+
+def dhash(image_path, size=HASH_SIZE):
+    """数据卡片的差值哈希：缩小为 (size + 1) x size 的灰度图后比较相邻像素，返回十六进制字符串"""
+    gray = nj_bk_ocr.load_gray(image_path)
+    x, y, w, h = nj_bk_ocr.find_stats_card(gray)
+    small = cv2.resize(gray[y:y + h, x:x + w], (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):0{size * size // 4}x}"
+
+def hamming(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def capture_time(image_path):
+    """从文件名或 EXIF 推断拍摄时间，返回 ISO 格式字符串，无法推断时返回 None"""
+    match = FILENAME_DATE_PATTERN.search(os.path.basename(image_path))
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+        return f"{year}-{month}-{day}T{hour or '00'}:{minute or '00'}:{second or '00'}"
+    try:
+        from PIL import Image
+        with Image.open(image_path) as image:
+            exif = image.getexif()
+            value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    except Exception:
+        return None
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value).strip(), '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+def load_intake_cache():
+    try:
+        with open(INTAKE_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_intake_cache(cache):
+    os.makedirs(os.path.dirname(INTAKE_CACHE_PATH), exist_ok=True)
+    with open(INTAKE_CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def describe_images(image_paths, hashes):
+    """每张图片的感知哈希和拍摄时间，已处理过的图片（按内容哈希）直接使用缓存"""
+    cache = load_intake_cache()
+    changed = False
+    info = {}
+    for path in image_paths:
+        entry = cache.get(hashes[path])
+        if not entry or entry.get('version') != INTAKE_VERSION:
+            try:
+                entry = {'version': INTAKE_VERSION, 'dhash': dhash(path), 'taken': capture_time(path)}
+            except ValueError as e:
+                print(str(e))
+                continue
+            cache[hashes[path]] = entry
+            changed = True
+        info[path] = entry
+    if changed:
+        save_intake_cache(cache)
+    return info
+
+def _preference(path, taken):
+    # 优先保留截图（无损、文字清晰），同类图片中保留当天最晚的一张
+    return (path.lower().endswith('.png'), taken or '', os.path.basename(path))
+
+def group_images(info, threshold=DUPLICATE_THRESHOLD):
+    """
+    将图片分组：同一天拍摄的图片为一组，近似重复的图片（包括无法推断日期的）并入同一组
+    返回 [[保留的图片, 重复的图片...], ...]，按日期排序
+    """
+    paths = list(info)
+    parent = {path: path for path in paths}
+
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    by_day = {}
+    for path in paths:
+        taken = info[path]['taken']
+        if taken:
+            by_day.setdefault(taken[:10], []).append(path)
+    for same_day in by_day.values():
+        for path in same_day[1:]:
+            union(same_day[0], path)
+
+    # 同一天的截图滚动位置不同，哈希可能相差很大，因此先按日期分组；哈希只用于找出副本，包括无法推断日期的图片
+    for i, a in enumerate(paths):
+        for b in paths[i + 1:]:
+            if find(a) != find(b) and hamming(info[a]['dhash'], info[b]['dhash']) <= threshold:
+                union(a, b)
+
+    groups = {}
+    for path in paths:
+        groups.setdefault(find(path), []).append(path)
+    result = []
+    for members in groups.values():
+        members.sort(key=lambda path: _preference(path, info[path]['taken']), reverse=True)
+        result.append(members)
+    result.sort(key=lambda members: (info[members[0]]['taken'] or '', members[0]))
+    return result
+
+def select_images(image_paths, hashes, threshold=DUPLICATE_THRESHOLD):
+    """返回每组保留的一张图片，以及 {保留的图片: [重复的图片...]}"""
+    groups = group_images(describe_images(image_paths, hashes), threshold)
+    duplicates = {members[0]: members[1:] for members in groups if len(members) > 1}
+    skipped = sum(len(others) for others in duplicates.values())
+    if skipped:
+        print(f"共 {len(image_paths)} 张图片，{skipped} 张为重复图片，不再识别")
+    return [members[0] for members in groups], duplicates
+
+def reencode(image_path, out_dir):
+    """
+    转为灰度并缩小到 OCR 使用的宽度，以无损 PNG 保存；识别时读到的像素与原图相同
+    返回新图片的路径
+    """
+    gray = nj_bk_ocr.load_gray(image_path)
+    os.makedirs(out_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    if name.lower().endswith(('.jpg', '.jpeg')):
+        name = os.path.splitext(name)[0]
+    out_path = os.path.join(out_dir, name + '.png')
+    ok, data = cv2.imencode('.png', gray, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+    if not ok:
+        raise ValueError(f"无法编码图片 {image_path}")
+    data.tofile(out_path)
+    return out_path
+
+if __name__ == "__main__":
+    import nj_bk_daily
+    parser = argparse.ArgumentParser(description='截图去重：每天只保留一张图片')
+    parser.add_argument('image_dir', help='截图目录')
+    parser.add_argument('--threshold', type=int, default=DUPLICATE_THRESHOLD, help='近似重复的汉明距离阈值')
+    parser.add_argument('--archive', default=None, help='将保留的图片压缩后另存到该目录')
+    args = parser.parse_args()
+
+    image_paths = nj_bk_daily.list_images(args.image_dir)
+    hashes = {path: nj_bk_daily.image_hash(path) for path in image_paths}
+    kept, duplicates = select_images(image_paths, hashes, args.threshold)
+    for path, others in duplicates.items():
+        print(f"保留 {os.path.basename(path)}，重复: {', '.join(os.path.basename(p) for p in others)}")
+    print(f"共 {len(image_paths)} 张图片，保留 {len(kept)} 张")
+    if args.archive:
+        before = sum(os.path.getsize(path) for path in kept)
+        after = sum(os.path.getsize(reencode(path, args.archive)) for path in kept)
+        print(f"已压缩保存到 {args.archive}: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB")
@@ -0,0 +1,278 @@
+# 贝壳截图的区域识别：用 OpenCV 找到数据卡片，只对数字区域做纯数字识别
+
+import re
+from datetime import date as Date
+import cv2
+import numpy as np
+import pytesseract
+
+# 卡片中的标签关键字与 CSV 列名的对应关系
+FIELD_LABELS = {
+    '成交均价': '成交均价',
+    '成交量': '成交量',
+    '新增挂牌': '新增挂牌',
+    '涨价': '涨价房源',
+    '降价': '降价房源',
+    '看房人数': '看房人数',
+    '看房量': '看房量',
+    '成交周期': '成交周期',
+}
+# 截图中的日期只有月、日，如 "12月03日数据"，年份按截图时间推断
+DATE_PATTERN = re.compile(r'(\d{4})[-./年](\d{1,2})[-./月](\d{1,2})|(\d{1,2})月(\d{1,2})日')
+DIGIT_CONFIG = '--psm 7 -c tessedit_char_whitelist=0123456789.'
+DATE_CONFIG = '--psm 7 -c tessedit_char_whitelist=0123456789年月日'
+VALUE_PATTERN = re.compile(r'^\d+(\.\d+)?$')
+# 定位标签时使用的图片宽度，数据卡片上的文字在该尺寸下仍可识别
+WORK_WIDTH = 1080
+
+# 同一版本 App 的截图卡片布局相同，按卡片尺寸缓存标签和日期的位置，
+# 命中时无需再做中文识别；缓存由 nj_bk_daily 保存到文件，并在多进程识别时传给各工作进程
+_layout_cache = {}
+
+def load_layouts(layouts):
+    """载入 dump_layouts 导出的布局，键为 "宽,高"（卡片尺寸除以 10）"""
+    for key, layout in layouts.items():
+        w, h = (int(n) for n in key.split(','))
+        _layout_cache[(w, h)] = {
+            'labels': {column: tuple(box) for column, box in layout['labels'].items()},
+            'date_box': tuple(layout['date_box']) if layout['date_box'] else None,
+        }
+
+def dump_layouts():
+    """导出当前进程中的布局，可写入 JSON"""
+    return {f'{w},{h}': {'labels': {column: list(box) for column, box in layout['labels'].items()},
+                         'date_box': list(layout['date_box']) if layout['date_box'] else None}
+            for (w, h), layout in _layout_cache.items()}
+
+def load_gray(image_path):
+    # 用 imdecode 读取，兼容中文文件名
+    data = np.fromfile(image_path, dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"无法读取图片 {image_path}")
+    if image.shape[1] > WORK_WIDTH:
+        scale = WORK_WIDTH / image.shape[1]
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return image
+
+def parse_date(text, captured=None):
+    """
+    从文字中找出日期，返回 YYYY-MM-DD，找不到或日期无效时返回 None
+    没有年份时取截图时间 captured（date，默认为今天）所在的年份，得到的日期晚于截图时间时为上一年（如 1 月截到的 12 月数据）
+    """
+    match = DATE_PATTERN.search(text or '')
+    if not match:
+        return None
+    year, month, day = match.groups()[:3] if match.group(1) else (None, *match.groups()[3:])
+    captured = captured or Date.today()
+    try:
+        if year:
+            return Date(int(year), int(month), int(day)).isoformat()
+        value = Date(captured.year, int(month), int(day))
+        if value > captured:
+            value = value.replace(year=captured.year - 1)
+        return value.isoformat()
+    except ValueError:
+        return None
+
+def find_stats_card(gray):
+    """找到截图中面积最大的浅色卡片区域，返回 (x, y, w, h)，找不到时返回整张图片"""
+    height, width = gray.shape
+    _, light = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
+    # 闭运算填平卡片内的文字，使卡片成为一个整体
+    light = cv2.morphologyEx(light, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 25)))
+    contours, _ = cv2.findContours(light, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    best = None
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        area_ratio = (w * h) / (width * height)
+        # 卡片应横向接近铺满，且不是整张背景
+        if 0.05 < area_ratio < 0.9 and w > width * 0.6:
+            if best is None or w * h > best[2] * best[3]:
+                best = (x, y, w, h)
+    return best or (0, 0, width, height)
+
+def binarize(gray):
+    """文字为黑、背景为白的二值图"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # 深色背景时反转
+    if binary.mean() < 127:
+        binary = 255 - binary
+    return binary
+
+def text_blobs(binary):
+    """将相邻字符合并为文字块，返回 [(x, y, w, h), ...]"""
+    ink = 255 - binary
+    merged = cv2.dilate(ink, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3)))
+    contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [cv2.boundingRect(c) for c in contours if cv2.boundingRect(c)[3] >= 8]
+
+def _union(boxes):
+    x0 = min(b[0] for b in boxes)
+    y0 = min(b[1] for b in boxes)
+    x1 = max(b[0] + b[2] for b in boxes)
+    y1 = max(b[1] + b[3] for b in boxes)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def card_binary(gray):
+    """
+    数据卡片及其上方区域的二值图，返回 (二值图, 卡片宽, 卡片下边缘)
+    旧版截图的日期在卡片上方的蓝色标题栏中，标题栏和卡片分别二值化，深色背景各自反转
+    """
+    x, y, w, h = find_stats_card(gray)
+    binary = binarize(gray[y:y + h, x:x + w])
+    if y > 0:
+        binary = np.vstack([binarize(gray[:y, x:x + w]), binary])
+    return binary, w, y + h
+
+def locate_labels(binary, captured=None):
+    """
+    对卡片做一次中文识别，只用于定位标签和日期
+    返回 ({列名: 标签框}, 日期字符串, 日期框)
+    """
+    data = pytesseract.image_to_data(binary, lang='chi_sim', config='--psm 11',
+                                     output_type=pytesseract.Output.DICT)
+    # 中文常被拆成单字，按行拼接后再查找关键字
+    lines = {}
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        box = (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+        lines.setdefault(key, []).append((word, box))
+
+    labels = {}
+    date = None
+    date_box = None
+    for words in lines.values():
+        words.sort(key=lambda item: item[1][0])
+        text = ''
+        owners = []
+        for index, (word, _) in enumerate(words):
+            text += word
+            owners.extend([index] * len(word))
+
+        match = DATE_PATTERN.search(text)
+        if match and date is None:
+            date = parse_date(match.group(0), captured)
+            covered = sorted(set(owners[match.start():match.end()]))
+            date_box = _union([words[i][1] for i in covered])
+
+        for keyword, column in FIELD_LABELS.items():
+            start = text.find(keyword)
+            if start < 0 or column in labels:
+                continue
+            covered = sorted(set(owners[start:start + len(keyword)]))
+            labels[column] = _union([words[i][1] for i in covered])
+    return labels, date, date_box
+
+def _segments(binary, box):
+    """按空白列把区域切分为单个字符，返回各字符的 (x, y, w, h)"""
+    x, y, w, h = box
+    ink = binary[y:y + h, x:x + w] < 128
+    columns = np.append(ink.any(axis=0), False)
+    segments = []
+    start = None
+    for i, filled in enumerate(columns):
+        if filled and start is None:
+            start = i
+        elif not filled and start is not None:
+            rows = np.flatnonzero(ink[:, start:i].any(axis=1))
+            segments.append((x + start, y + int(rows[0]), i - start, int(rows[-1] - rows[0]) + 1))
+            start = None
+    return segments
+
+def value_box(binary, label, blobs, labels):
+    """
+    标签正下方的第一行文字为数值，返回其中数字部分的区域，找不到时返回 None
+    数值后面的单位（套、人、万/㎡）比数字矮，或与数字等高但接近方形（卡片较小时），都不包含在内
+    """
+    lx, ly, lw, lh = label
+    candidates = [
+        blob for blob in blobs
+        if not any(_overlap(blob, other) for other in labels.values())
+        # 排除卡片边框等大块区域，只看标签下方、左边缘与标签大致对齐的文字
+        and blob[3] < lh * 3 and ly + lh * 0.8 <= blob[1] <= ly + lh * 4
+        and lx - lw * 0.5 <= blob[0] <= lx + lw
+    ]
+    if not candidates:
+        return None
+    first = min(candidates, key=lambda blob: blob[1])
+    row = [blob for blob in candidates if blob[1] < first[1] + first[3] * 0.5]
+    segments = _segments(binary, _union(row))
+    top = min(segment[1] for segment in segments)
+    height = max(segment[1] + segment[3] for segment in segments) - top
+
+    def tall(segment):
+        return segment[1] <= top + height * 0.15 and segment[3] >= height * 0.7
+
+    digits = []
+    for segment in segments:
+        # 小数点矮且贴近底部，只在数字之间出现
+        dot = digits and segment[2] < height * 0.35 and segment[1] >= top + height * 0.6
+        if not (tall(segment) or dot):
+            break
+        digits.append(segment)
+    while digits and not tall(digits[-1]):
+        digits.pop()
+    # 与数字等高的单位字符接近方形，数字的宽度不超过高度的 0.7 倍
+    if len(digits) > 1 and 0.85 <= digits[-1][2] / height <= 1.15:
+        digits.pop()
+    return _union(digits) if digits else None
+
+def _overlap(a, b):
+    return (min(a[0] + a[2], b[0] + b[2]) > max(a[0], b[0]) and
+            min(a[1] + a[3], b[1] + b[3]) > max(a[1], b[1]))
+
+def read_digits(binary, box, config=DIGIT_CONFIG, lang=None):
+    """对单个数值区域做纯数字识别，识别日期时需要 lang='chi_sim' 以识别月、日"""
+    x, y, w, h = box
+    roi = binary[max(y - 2, 0):y + h + 2, max(x - 2, 0):x + w + 2]
+    # 放大到 Tesseract 擅长的字高，并留出白边
+    scale = max(1.0, 48 / max(roi.shape[0], 1))
+    roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    roi = cv2.copyMakeBorder(roi, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=255)
+    text = pytesseract.image_to_string(roi, lang=lang, config=config).strip()
+    return text or None
+
+def read_fields(binary, labels, date_box=None, captured=None):
+    """根据标签位置找到各字段的数值区域并识别，date_box 不为空时同时识别日期；不是数字的识别结果丢弃"""
+    blobs = text_blobs(binary)
+    result = {}
+    if date_box is not None:
+        date = parse_date(read_digits(binary, date_box, DATE_CONFIG, lang='chi_sim'), captured)
+        if date:
+            result['日期'] = date
+    for column, label in labels.items():
+        box = value_box(binary, label, blobs, labels)
+        if box is not None:
+            value = read_digits(binary, box)
+            if value and VALUE_PATTERN.match(value):
+                result[column] = value
+    return result
+
+def extract_fields(image_path, captured=None):
+    """
+    识别截图中数据卡片的各个字段，返回 {列名: 值}，未识别的字段不包含在结果中
+    captured 为截图日期（date），用于推断截图中日期的年份
+    """
+    gray = load_gray(image_path)
+    binary, w, bottom = card_binary(gray)
+
+    # 布局已知时只做纯数字识别，识别出日期和大部分字段才认为布局仍然适用
+    layout_key = (w // 10, bottom // 10)
+    layout = _layout_cache.get(layout_key)
+    if layout:
+        result = read_fields(binary, layout['labels'], layout['date_box'], captured)
+        if '日期' in result and len(result) * 2 > len(layout['labels']) + 1:
+            return result
+
+    labels, date, date_box = locate_labels(binary, captured)
+    if labels:
+        _layout_cache[layout_key] = {'labels': labels, 'date_box': date_box}
+    result = read_fields(binary, labels)
+    if date:
+        result['日期'] = date
+    return result
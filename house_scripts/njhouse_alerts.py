@@ -0,0 +1,234 @@
+# 数据提醒：每条新数据写入后立即按规则检查（阈值、成交量异常、挂牌量骤降），无需绘图
+# 各规则只保存滚动状态，每条新数据的检查为 O(1)
+# 用法: python njhouse_alerts.py [--send]
+
+import os
+import json
+import math
+import argparse
+import threading
+from collections import deque
+import numpy as np
+import njhouse_data
+import njhouse_metrics
+import njhouse_stock
+import njhouse_store
+
+ALERT_STATE_PATH = os.path.join(njhouse_data.DATA_DIR, 'alert_state.json')
+ALERT_TITLE = '南京房产数据提醒'
+# 降涨比超过该值时提醒，图表中的警戒线使用同一数值
+PRICE_CHANGE_RATIO_LIMIT = 10
+# 挂牌房源和贝壳数据可能在不同线程中检查，读写状态文件时加锁
+_state_lock = threading.Lock()
+
+class ThresholdRule:
+    """数值超过（或低于）固定阈值"""
+
+    def __init__(self, name, column, limit, above=True):
+        self.name = name
+        self.column = column
+        self.limit = limit
+        self.above = above
+
+    def check(self, row):
+        value = row.get(self.column)
+        if value is None:
+            return None
+        if (value > self.limit) if self.above else (value < self.limit):
+            return f"{self.column} {value:g} {'高于' if self.above else '低于'} {self.limit:g}"
+        return None
+
+    def state(self):
+        return {}
+
+    def load(self, state):
+        pass
+
+class ZScoreRule:
+    """数值与最近 window 条数据的均值相差超过 threshold 个标准差，窗口的和与平方和随数据滚动更新"""
+
+    def __init__(self, name, column, window=30, threshold=3.0, min_samples=10):
+        self.name = name
+        self.column = column
+        self.window = window
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.load({})
+
+    def check(self, row):
+        value = row.get(self.column)
+        if value is None:
+            return None
+        message = None
+        n = len(self.values)
+        if n >= self.min_samples:
+            mean = self.total / n
+            std = math.sqrt(max(self.total_sq / n - mean * mean, 0.0))
+            if std > 0 and abs(value - mean) / std >= self.threshold:
+                z = (value - mean) / std
+                message = f"{self.column} {value:g}，为近 {n} 天均值 {mean:.0f} 的 {z:+.1f} 个标准差"
+
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+        return message
+
+    def state(self):
+        return {'values': list(self.values)}
+
+    def load(self, state):
+        self.values = deque(state.get('values', []))
+        self.total = sum(self.values)
+        self.total_sq = sum(value * value for value in self.values)
+
+class DropRule:
+    """数值较上一条数据下降超过 pct（比例）"""
+
+    def __init__(self, name, column, pct):
+        self.name = name
+        self.column = column
+        self.pct = pct
+        self.load({})
+
+    def check(self, row):
+        value = row.get(self.column)
+        if value is None:
+            return None
+        message = None
+        if self.last and value < self.last * (1 - self.pct):
+            message = f"{self.column} 由 {self.last:g} 降至 {value:g}（{(value - self.last) / self.last:+.1%}）"
+        self.last = value
+        return message
+
+    def state(self):
+        return {'last': self.last}
+
+    def load(self, state):
+        self.last = state.get('last')
+
+def default_rules():
+    """各数据流的规则，每行数据包含源数据的列和派生指标表的列"""
+    return {
+        'stock': [
+            ZScoreRule('成交量异常', '昨日住宅成交量', window=30, threshold=3.0),
+            DropRule('挂牌量骤降', '总挂牌房源', pct=0.02),
+        ],
+        'bk': [
+            ThresholdRule('降涨比超过警戒线', '价格变动比', PRICE_CHANGE_RATIO_LIMIT),
+        ],
+    }
+
+def _value(value):
+    if value is None or value == njhouse_store.MISSING or np.isnan(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+def store_rows(store_dirs, after_days=None):
+    """读取一个或多个同日期的存储中 after_days 之后的行，按日期升序，返回 [(天数, {列名: 值})]"""
+    rows = {}
+    for store_dir in store_dirs:
+        if not njhouse_store.store_exists(store_dir):
+            continue
+        schema = njhouse_store.load_schema(store_dir)
+        days = np.asarray(njhouse_store.read_column(store_dir, '日期', schema), dtype=np.int64)
+        index = np.flatnonzero(days > after_days) if after_days is not None else np.arange(len(days))
+        columns = {column: njhouse_store.read_column(store_dir, column, schema)
+                   for column, _, _ in schema if column != '日期'}
+        for i in index:
+            row = rows.setdefault(int(days[i]), {})
+            for column, values in columns.items():
+                row.setdefault(column, _value(values[i]))
+    return sorted(rows.items())
+
+def bk_rows(after_days=None):
+    """贝壳数据的新行，与贝壳派生指标合并"""
+    df = njhouse_data.load_bk()
+    days = df['日期'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    index = np.flatnonzero(days > after_days) if after_days is not None else np.arange(len(days))
+    metrics = dict(store_rows([njhouse_metrics.BK_METRICS_DIR], after_days))
+    rows = {}
+    for i in index:
+        row = {column: _value(df[column].iat[i]) for column in ('成交量', '涨价房源', '降价房源')}
+        rows.setdefault(int(days[i]), {**row, **metrics.get(int(days[i]), {})})
+    return sorted(rows.items())
+
+def load_state(path=ALERT_STATE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state, path=ALERT_STATE_PATH):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+def evaluate(stream, rules, rows, state):
+    """
+    依次检查新数据，返回触发的提醒 [{'date', 'rule', 'message'}]，并更新 state
+    首次运行（没有保存的状态）时用全部历史数据初始化规则状态，只提醒最新一天
+    """
+    first_run = stream not in state
+    saved = state.get(stream, {})
+    for rule in rules:
+        rule.load(saved.get('rules', {}).get(rule.name, {}))
+
+    alerts = []
+    last_days = saved.get('last_days')
+    for days, row in rows:
+        date = str(np.datetime64(days, 'D'))
+        for rule in rules:
+            message = rule.check(row)
+            if message:
+                alerts.append({'date': date, 'rule': rule.name, 'message': message})
+        last_days = days
+
+    if first_run and last_days is not None:
+        latest = str(np.datetime64(last_days, 'D'))
+        alerts = [alert for alert in alerts if alert['date'] == latest]
+    state[stream] = {'last_days': last_days, 'rules': {rule.name: rule.state() for rule in rules}}
+    return alerts
+
+def check_new_rows(rules=None, state_path=ALERT_STATE_PATH, streams=None):
+    """
+    检查上次之后新增的挂牌房源和贝壳数据，返回触发的提醒
+    streams 为要检查的数据（stock、bk），默认全部；各数据的状态相互独立，可以在各自的派生指标更新后分别检查
+    """
+    rules = rules or default_rules()
+    sources = {
+        'stock': lambda after: store_rows([njhouse_stock.STOCK_STORE_DIR, njhouse_metrics.STOCK_METRICS_DIR], after),
+        'bk': bk_rows,
+    }
+    alerts = []
+    with _state_lock:
+        state = load_state(state_path)
+        for stream, read_rows in sources.items():
+            if streams is not None and stream not in streams:
+                continue
+            after = state.get(stream, {}).get('last_days')
+            alerts += evaluate(stream, rules[stream], read_rows(after), state)
+        save_state(state, state_path)
+    return alerts
+
+def format_alerts(alerts):
+    """通知正文，每条提醒一行"""
+    return '\n'.join(f"{alert['date']} {alert['rule']}：{alert['message']}" for alert in alerts)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='检查新增数据是否触发提醒规则')
+    parser.add_argument('--send', action='store_true', help='有提醒时通过 Bark 发送')
+    args = parser.parse_args()
+
+    alerts = check_new_rows()
+    if alerts:
+        print(format_alerts(alerts))
+        if args.send:
+            import send_notification
+            send_notification.send_notification(ALERT_TITLE, format_alerts(alerts))
+    else:
+        print('没有触发提醒')
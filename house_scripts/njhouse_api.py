@@ -0,0 +1,313 @@
+# 本地只读数据接口：各数据集读入内存后按日期建立有序索引，区间查询和聚合用二分查找定位，无需每次解析 CSV
+# 支持 ETag / If-Modified-Since，数据未变化时返回 304；数据文件变化后下一次请求自动重新读取
+# 用法: python njhouse_api.py [--host 127.0.0.1] [--port 8000]
+#   GET /datasets                                          各数据集的行数、日期范围和列
+#   GET /<数据集>?start=2025-01-01&end=2025-03-31&columns=总挂牌房源,昨日住宅成交量
+#   GET /<数据集>/latest                                   最新一行
+#   GET /<数据集>/aggregate?column=昨日住宅成交量&how=sum&start=...&end=...[&freq=weekly]
+#   以上路径都支持 HEAD，只返回响应头
+
+import os
+import json
+import time
+import bisect
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import njhouse_data
+import njhouse_store
+import njhouse_metrics
+import plot_downsample
+
+# 数据集名称: (文件路径, 列类型)
+DATASETS = {
+    'stock': (njhouse_data.STOCK_CSV_PATH, njhouse_data.STOCK_DTYPES),
+    'bk': (njhouse_data.BK_CSV_PATH, njhouse_data.BK_DTYPES),
+    'policy': (njhouse_data.POLICY_CSV_PATH, njhouse_data.POLICY_DTYPES),
+    'stock_metrics': (njhouse_data.STOCK_METRICS_CSV_PATH, njhouse_data.STOCK_METRICS_DTYPES),
+    'bk_metrics': (njhouse_data.BK_METRICS_CSV_PATH, njhouse_data.BK_METRICS_DTYPES),
+}
+AGGREGATIONS = ['count', 'sum', 'mean', 'min', 'max', 'first', 'last']
+
+def _integer_columns(schema):
+    return {column for column, _, dtype in schema if column != '日期' and dtype == 'int32'}
+
+# 存储中为整数的列：CSV 读入时为容纳缺失值是 float64，接口中仍按整数返回
+INTEGER_COLUMNS = {
+    'stock': _integer_columns(njhouse_store.STOCK_SCHEMA),
+    'bk': _integer_columns(njhouse_store.BK_OCR_SCHEMA),
+    'stock_metrics': _integer_columns(njhouse_metrics.STOCK_METRICS_SCHEMA),
+}
+
+class QueryError(ValueError):
+    """请求参数错误，返回 400"""
+
+def _parse_day(text):
+    try:
+        return int(np.datetime64(text, 'D').astype(np.int64))
+    except ValueError:
+        raise QueryError(f"无法解析的日期: {text}")
+
+def _json_value(value):
+    # NaN 写为 null
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+class DatasetIndex:
+    """
+    一个数据集的内存索引：日期为升序的整数列表（1970-01-01 起的天数），可用 bisect 定位区间
+    数值列另外保存前缀和与非缺失计数，区间求和、平均值为 O(1)
+    """
+
+    def __init__(self, name, df, digest, mtime, integer_columns=()):
+        self.name = name
+        self.digest = digest
+        self.mtime = mtime
+        self.days = df['日期'].to_numpy().astype('datetime64[D]').astype(np.int64).tolist()
+        self.dates = [str(np.datetime64(day, 'D')) for day in self.days]
+        self.columns = [column for column in df.columns if column != '日期']
+        self.integer = set(integer_columns) & set(self.columns)
+        self.values = {}
+        self.numeric = {}
+        for column in self.columns:
+            series = df[column]
+            if series.dtype.kind == 'f':
+                array = series.to_numpy(dtype='float64')
+                self.numeric[column] = array
+                valid = ~np.isnan(array)
+                self.numeric[column + ':sum'] = np.concatenate([[0.0], np.cumsum(np.where(valid, array, 0.0))])
+                self.numeric[column + ':count'] = np.concatenate([[0], np.cumsum(valid)])
+            self.values[column] = [self._cast(column, _json_value(v))
+                                   for v in series.astype(object).where(series.notna(), None).tolist()]
+
+    def _cast(self, column, value):
+        """整数列的值（及求和、最小、最大值）转为 int，平均值等其他结果不变"""
+        return int(value) if column in self.integer and value is not None else value
+
+    def locate(self, start=None, end=None):
+        """返回 [start, end] 日期区间对应的下标范围 (lo, hi)，两端都包含"""
+        lo = bisect.bisect_left(self.days, _parse_day(start)) if start else 0
+        hi = bisect.bisect_right(self.days, _parse_day(end)) if end else len(self.days)
+        return lo, max(lo, hi)
+
+    def _check_columns(self, columns):
+        unknown = [column for column in columns if column not in self.values]
+        if unknown:
+            raise QueryError(f"{self.name} 没有列: {', '.join(unknown)}")
+
+    def rows(self, lo, hi, columns=None):
+        columns = columns or self.columns
+        self._check_columns(columns)
+        data = [self.values[column][lo:hi] for column in columns]
+        return {'dataset': self.name, 'columns': ['日期'] + columns,
+                'rows': [list(row) for row in zip(self.dates[lo:hi], *data)]}
+
+    def aggregate(self, lo, hi, column, how):
+        self._check_columns([column])
+        if column not in self.numeric and how not in ('count', 'first', 'last'):
+            raise QueryError(f"{column} 不是数值列")
+        if how == 'count':
+            if column in self.numeric:
+                counts = self.numeric[column + ':count']
+                return int(counts[hi] - counts[lo])
+            return sum(v is not None for v in self.values[column][lo:hi])
+        if how in ('first', 'last'):
+            present = [i for i in (range(lo, hi) if how == 'first' else range(hi - 1, lo - 1, -1))
+                       if self.values[column][i] is not None]
+            return {'date': self.dates[present[0]], 'value': self.values[column][present[0]]} if present else None
+        if how in ('sum', 'mean'):
+            total = self.numeric[column + ':sum'][hi] - self.numeric[column + ':sum'][lo]
+            count = self.numeric[column + ':count'][hi] - self.numeric[column + ':count'][lo]
+            if how == 'sum':
+                return self._cast(column, float(total))
+            return float(total / count) if count else None
+        if how in ('min', 'max'):
+            window = self.numeric[column][lo:hi]
+            if not len(window) or np.isnan(window).all():
+                return None
+            return self._cast(column, float(np.nanmin(window) if how == 'min' else np.nanmax(window)))
+        raise QueryError(f"未知的聚合方式: {how}，可选: {', '.join(AGGREGATIONS)}")
+
+    def aggregate_by(self, lo, hi, column, how, freq):
+        """按周或按月分组聚合，返回 [[区间起始日期, 值], ...]"""
+        self._check_columns([column])
+        if column not in self.numeric:
+            raise QueryError(f"{column} 不是数值列")
+        if how not in ('sum', 'mean', 'min', 'max'):
+            raise QueryError("分组聚合只支持 sum、mean、min、max")
+        if freq not in plot_downsample.BIN_DAYS:
+            raise QueryError(f"未知的分组方式: {freq}，可选: {', '.join(plot_downsample.BIN_DAYS)}")
+        days = np.asarray(self.days[lo:hi], dtype=np.int64)
+        keys, values = plot_downsample.aggregate(days, self.numeric[column][lo:hi], freq, how)
+        values = [_json_value(value) for value in values]
+        if how != 'mean':
+            values = [self._cast(column, value) for value in values]
+        return [[str(np.datetime64(int(key), 'D')), value] for key, value in zip(keys, values)]
+
+    def summary(self):
+        return {
+            'rows': len(self.days),
+            'first': self.dates[0] if self.dates else None,
+            'last': self.dates[-1] if self.dates else None,
+            'columns': self.columns,
+        }
+
+_indexes = {}
+_lock = threading.Lock()
+
+def get_index(name):
+    """返回数据集的索引；文件的修改时间或大小变化时重新读取，内容未变时沿用原索引"""
+    if name not in DATASETS:
+        raise KeyError(name)
+    path, dtypes = DATASETS[name]
+    stat = os.stat(path)
+    state = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _indexes.get(name)
+        if cached and cached[0] == state:
+            return cached[2]
+        df = njhouse_data.load_dataset(path, dtypes)
+        if cached and cached[1] is df:
+            index = cached[2]
+            index.mtime = stat.st_mtime
+        else:
+            index = DatasetIndex(name, df, njhouse_data.dataset_digest(path), stat.st_mtime, INTEGER_COLUMNS.get(name, ()))
+        _indexes[name] = (state, df, index)
+        return index
+
+def available_indexes():
+    """所有存在的数据集的索引，不存在的文件（如尚未生成的指标表）跳过"""
+    indexes = {}
+    for name in DATASETS:
+        try:
+            indexes[name] = get_index(name)
+        except FileNotFoundError:
+            continue
+    return indexes
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = 'njhouse-api/1'
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            if parts == ['datasets']:
+                indexes = available_indexes()
+                etag = hashlib.sha256(''.join(index.digest for index in indexes.values()).encode()).hexdigest()
+                # 还没有任何数据集时返回空结果，不发送 Last-Modified
+                mtime = max((index.mtime for index in indexes.values()), default=None)
+                if self._not_modified(etag, mtime):
+                    return
+                body = {name: index.summary() for name, index in indexes.items()}
+            elif parts and len(parts) <= 2:
+                index = get_index(parts[0])
+                etag, mtime = index.digest, index.mtime
+                if self._not_modified(etag, mtime):
+                    return
+                body = self._query(index, parts[1] if len(parts) == 2 else None, query)
+            else:
+                return self._send_json(404, {'error': f"未知的路径: {url.path}"})
+        except (KeyError, FileNotFoundError):
+            return self._send_json(404, {'error': f"未知的数据集: {parts[0]}"})
+        except QueryError as e:
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(200, body, etag, mtime, time.perf_counter() - start)
+
+    def do_HEAD(self):
+        # 与 GET 相同的查询和响应头，由 _send_json 省略响应体
+        self.do_GET()
+
+    def _query(self, index, action, query):
+        lo, hi = index.locate(query.get('start'), query.get('end'))
+        if action is None:
+            columns = query['columns'].split(',') if query.get('columns') else None
+            return index.rows(lo, hi, columns)
+        if action == 'latest':
+            return index.rows(max(lo, hi - 1), hi)
+        if action == 'aggregate':
+            column = query.get('column')
+            if not column:
+                raise QueryError('缺少参数 column')
+            how = query.get('how', 'mean')
+            result = {'dataset': index.name, 'column': column, 'how': how,
+                      'start': index.dates[lo] if lo < hi else None,
+                      'end': index.dates[hi - 1] if lo < hi else None}
+            if query.get('freq'):
+                result['freq'] = query['freq']
+                result['values'] = index.aggregate_by(lo, hi, column, how, query['freq'])
+            else:
+                result['value'] = index.aggregate(lo, hi, column, how)
+            return result
+        raise QueryError(f"未知的操作: {action}，可选: latest、aggregate")
+
+    def _not_modified(self, etag, mtime):
+        """客户端的缓存仍然有效时返回 304"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            matched = f'"{etag}"' in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            matched = False
+            if_modified_since = self.headers.get('If-Modified-Since')
+            if if_modified_since:
+                try:
+                    # HTTP 日期精确到秒
+                    matched = mtime is not None and int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+                except (TypeError, ValueError):
+                    matched = False
+        if matched:
+            self.send_response(304)
+            self._cache_headers(etag, mtime)
+            self.end_headers()
+        return matched
+
+    def _cache_headers(self, etag, mtime):
+        self.send_header('ETag', f'"{etag}"')
+        if mtime is not None:
+            self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        # 允许缓存，但每次使用前都需要校验
+        self.send_header('Cache-Control', 'no-cache')
+
+    def _send_json(self, status, body, etag=None, mtime=None, elapsed=None):
+        content = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if etag is not None:
+            self._cache_headers(etag, mtime)
+        if elapsed is not None:
+            self.send_header('Server-Timing', f'query;dur={elapsed * 1000:.3f}')
+        self.end_headers()
+        # HEAD 请求只返回响应头，Content-Length 仍是完整响应体的长度
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+def serve(host='127.0.0.1', port=8000):
+    # 启动时读取全部数据集，第一次请求无需等待解析
+    for name, index in available_indexes().items():
+        print(f"{name}: {index.summary()['rows']} 行")
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    print(f"数据接口已启动: http://{host}:{port}/datasets")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='本地只读数据接口')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口')
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,109 @@
+# 历史数据回填：批量解析保存下来的页面快照（如网页存档），按快照日期写入挂牌房源数据
+# 用法: python njhouse_backfill.py 快照目录 [--workers N] [--checkpoint 文件]
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+import njhouse_stock
+import njhouse_store
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHECKPOINT = os.path.join(script_dir, 'njhouse_stock_daily', 'backfill_checkpoint.json')
+SNAPSHOT_EXTENSIONS = ('.html', '.htm')
+# 网页存档的 14 位 UTC 时间戳，如 20250101033000
+ARCHIVE_TIMESTAMP = re.compile(r'(?<!\d)(\d{14})(?!\d)')
+# 文件名中的日期（按北京时间），如 2025-01-01 或 20250101
+NAME_DATE = re.compile(r'(?<!\d)(\d{4})-?(\d{2})-?(\d{2})(?!\d)')
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+def snapshot_time(path):
+    """推断快照的北京时间：优先使用文件名中的存档时间戳或日期，否则使用文件修改时间"""
+    name = os.path.basename(path)
+    match = ARCHIVE_TIMESTAMP.search(name)
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc).astimezone(BEIJING_TZ)
+    match = NAME_DATE.search(name)
+    if match:
+        # 文件名中的 8 位数字不一定是日期（如 page12345678.html），无效时改用修改时间
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=BEIJING_TZ)
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(path), BEIJING_TZ)
+
+def parse_snapshot(path):
+    """
+    解析单个快照，返回一行数据；页面中没有任何数据时返回 None
+    解析出错时返回 {'错误': 错误信息}，不影响其他快照
+    """
+    try:
+        taken_at = snapshot_time(path)
+        with open(path, encoding='utf-8', errors='replace') as f:
+            data = njhouse_stock.parse_house_data(f.read())
+    except Exception as e:
+        return {'错误': f"{type(e).__name__}: {e}"}
+    if all(value is None for value in data.values()):
+        return None
+    # 与每日任务一致，快照中的数据记为快照前一天
+    data['日期'] = (taken_at - timedelta(days=1)).strftime('%Y-%m-%d')
+    data['快照时间'] = taken_at.isoformat()
+    return data
+
+def load_checkpoint(checkpoint_path):
+    try:
+        with open(checkpoint_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+def backfill(snapshot_dir, workers=None, checkpoint_path=DEFAULT_CHECKPOINT, checkpoint_every=200):
+    """
+    多进程解析目录中的所有快照，解析结果定期写入检查点，中断后重新运行会跳过已解析的文件；
+    解析出错的快照跳过且不写入检查点，下次运行时重试；全部解析完成后一次性合并进存储并导出 CSV
+    """
+    paths = sorted(os.path.abspath(os.path.join(root, name))
+                   for root, _, names in os.walk(snapshot_dir)
+                   for name in names if name.lower().endswith(SNAPSHOT_EXTENSIONS))
+    checkpoint = load_checkpoint(checkpoint_path)
+    todo = [path for path in paths if path not in checkpoint]
+    print(f"共 {len(paths)} 个快照，已解析 {len(paths) - len(todo)} 个，本次解析 {len(todo)} 个")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(todo) // ((workers or os.cpu_count() or 1) * 8))
+            for count, (path, row) in enumerate(zip(todo, executor.map(parse_snapshot, todo, chunksize=chunksize)), 1):
+                if row and '错误' in row:
+                    print(f"跳过 {path}：{row['错误']}")
+                else:
+                    checkpoint[path] = row
+                if count % checkpoint_every == 0:
+                    save_checkpoint(checkpoint_path, checkpoint)
+                    print(f"已解析 {count}/{len(todo)}")
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    # 同一天有多个快照时使用最晚的一个
+    wanted = set(paths)
+    rows = sorted((row for path, row in checkpoint.items() if row and path in wanted),
+                  key=lambda row: row['快照时间'], reverse=True)
+    store_dir = njhouse_stock.ensure_stock_store()
+    added = njhouse_store.merge_rows(store_dir, rows)
+    njhouse_store.export_csv(store_dir, njhouse_stock.STOCK_CSV_PATH)
+    print(f"回填完成：有效快照 {len(rows)} 个，新增 {added} 天的数据，已导出到 {njhouse_stock.STOCK_CSV_PATH}")
+    return added
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='从保存的页面快照回填历史挂牌房源数据')
+    parser.add_argument('snapshot_dir', help='快照所在目录（会递归查找 .html/.htm 文件）')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认等于 CPU 核数')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='检查点文件路径')
+    args = parser.parse_args()
+    backfill(args.snapshot_dir, workers=args.workers, checkpoint_path=args.checkpoint)
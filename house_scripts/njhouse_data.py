@@ -0,0 +1,125 @@
+# 数据集统一读取：每个 CSV 在进程内只解析一次，文件变化时自动重新读取
+# 返回的 DataFrame 由所有调用方共享，需要修改时请先 copy()
+
+import os
+import io
+import hashlib
+import threading
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(script_dir, 'njhouse_stock_daily')
+STOCK_CSV_PATH = os.path.join(DATA_DIR, 'njhouse_stock_daily.csv')
+BK_CSV_PATH = os.path.join(DATA_DIR, 'njhouse_bk_daily.csv')
+POLICY_CSV_PATH = os.path.join(DATA_DIR, 'njhouse_policy.csv')
+# 派生指标表，由 njhouse_metrics 增量生成
+STOCK_METRICS_CSV_PATH = os.path.join(DATA_DIR, 'njhouse_stock_metrics.csv')
+BK_METRICS_CSV_PATH = os.path.join(DATA_DIR, 'njhouse_bk_metrics.csv')
+# 贝壳 App 截图目录，位于仓库根目录
+PICTURES_DIR = os.path.join(os.path.dirname(script_dir), 'nj_bk_daily_pictures')
+
+# 各数据集的列类型，数值列缺失时为 NaN
+STOCK_DTYPES = {
+    '总挂牌房源': 'float64',
+    '中介挂牌房源': 'float64',
+    '个人挂牌房源': 'float64',
+    '昨日住宅成交量': 'float64',
+    '周几': 'string',
+}
+BK_DTYPES = {
+    '成交量': 'float64',
+    '涨价房源': 'float64',
+    '降价房源': 'float64',
+    '周几': 'string',
+}
+STOCK_METRICS_DTYPES = {
+    '7日成交量': 'float64',
+    '30日成交量': 'float64',
+    '挂牌变化': 'float64',
+    '去化周期(月)': 'float64',
+    '星期调整成交量': 'float64',
+    '周几': 'string',
+}
+BK_METRICS_DTYPES = {
+    '价格变动比': 'float64',
+    '周几': 'string',
+}
+POLICY_DTYPES = {
+    '政策': 'string',
+    '具体内容': 'string',
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+def _parse(raw, dtypes):
+    import pandas as pd
+    df = pd.read_csv(io.BytesIO(raw), encoding='utf-8-sig', dtype=str)
+    for column, dtype in dtypes.items():
+        if column not in df:
+            continue
+        if dtype == 'float64':
+            # 旧数据中有"未找到"等文字，按缺失处理
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        else:
+            df[column] = df[column].astype(dtype)
+    df['日期'] = pd.to_datetime(df['日期'])
+    df = df.sort_values('日期', kind='stable', ignore_index=True)
+    df.index = pd.DatetimeIndex(df['日期'].to_numpy())
+    return df
+
+def load_dataset(path, dtypes):
+    """
+    读取并缓存数据集，按日期升序，索引为日期
+    每次调用只检查文件的修改时间和大小；两者变化但内容哈希未变时沿用缓存
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        stat = os.stat(path)
+        state = (stat.st_mtime_ns, stat.st_size)
+        cached = _cache.get(path)
+        if cached and cached['state'] == state:
+            return cached['df']
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached['digest'] == digest:
+            cached['state'] = state
+            return cached['df']
+
+        df = _parse(raw, dtypes)
+        _cache[path] = {'state': state, 'digest': digest, 'df': df}
+        return df
+
+def dataset_digest(path):
+    """已读取的数据集文件内容的 sha256，需先调用 load_dataset"""
+    with _lock:
+        return _cache[os.path.abspath(path)]['digest']
+
+def load_stock(path=STOCK_CSV_PATH):
+    return load_dataset(path, STOCK_DTYPES)
+
+def load_bk(path=BK_CSV_PATH):
+    return load_dataset(path, BK_DTYPES)
+
+def load_stock_metrics(path=STOCK_METRICS_CSV_PATH):
+    return load_dataset(path, STOCK_METRICS_DTYPES)
+
+def load_bk_metrics(path=BK_METRICS_CSV_PATH):
+    """指标表尚未生成时返回 None"""
+    try:
+        return load_dataset(path, BK_METRICS_DTYPES)
+    except FileNotFoundError:
+        return None
+
+def load_policy(path=POLICY_CSV_PATH):
+    """政策数据是可选的，文件不存在时返回 None"""
+    try:
+        return load_dataset(path, POLICY_DTYPES)
+    except FileNotFoundError:
+        print("政策数据文件不存在，将不显示政策信息")
+        return None
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,211 @@
+# 政策事件研究：以每条政策的日期为界取前后两个时间窗口，比较政策后挂牌量、成交量、降涨比相对于星期调整基准的异常变化，
+# 输出每条政策、每个指标一行的影响表；所有城市、政策和指标的窗口通过 NumPy 跨步视图一次取出，不逐条循环
+# 政策表可以有 城市 列（对应存储中的城市分区），没有时全部视为南京的政策
+# 用法: python njhouse_event_study.py [--pre 28] [--post 28] [--model mean|trend] [--output 文件]
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import njhouse_data
+import njhouse_stock
+import njhouse_store
+import njhouse_metrics
+import plot_downsample
+
+IMPACT_CSV_PATH = os.path.join(njhouse_data.DATA_DIR, 'njhouse_policy_impact.csv')
+DEFAULT_CITY = 'nanjing'
+# 政策前、后窗口的天数，取 7 的倍数，窗口内每个星期几的天数相同
+PRE_DAYS = 28
+POST_DAYS = 28
+# 窗口内有效数据少于该天数时不计算
+MIN_SAMPLES = 7
+# 指标: 所在的存储分区
+METRICS = {
+    '总挂牌房源': 'njhouse_stock',
+    '昨日住宅成交量': 'njhouse_stock',
+    '价格变动比': 'bk_metrics',
+}
+# 基准模型：mean 为政策前窗口的均值，trend 为政策前窗口的线性趋势外推（适合持续变化的挂牌量）
+MODELS = ['mean', 'trend']
+IMPACT_COLUMNS = ['城市', '日期', '政策', '指标', '基准', '实际', '异常变化', '异常变化率', 't值', '前天数', '后天数']
+
+def load_series(store_root=None, cities=None):
+    """
+    读取各城市存储中的指标列，返回 {(城市, 指标): (天数数组, 值数组)}
+    城市为存储根目录下的分区，缺少某个分区的城市跳过对应的指标
+    """
+    store_root = store_root or njhouse_stock.STORE_ROOT
+    if cities is None:
+        cities = sorted(name for name in os.listdir(store_root) if os.path.isdir(os.path.join(store_root, name)))
+    series = {}
+    for city in cities:
+        for source in dict.fromkeys(METRICS.values()):
+            store_dir = njhouse_store.partition_dir(store_root, city, source)
+            if not njhouse_store.store_exists(store_dir):
+                continue
+            columns = [metric for metric, metric_source in METRICS.items() if metric_source == source]
+            days, values = plot_downsample.load_columns(store_dir, columns)
+            for metric in columns:
+                series[(city, metric)] = (days, values[metric])
+    return series
+
+def load_events(policy_df=None):
+    """政策表转为事件表：城市、日期（1970-01-01 起的天数）、政策"""
+    if policy_df is None:
+        policy_df = njhouse_data.load_policy()
+    if policy_df is None or policy_df.empty:
+        return pd.DataFrame({'城市': pd.Series(dtype=str), '日期': pd.Series(dtype='int64'), '政策': pd.Series(dtype=str)})
+    cities = policy_df['城市'] if '城市' in policy_df.columns else DEFAULT_CITY
+    return pd.DataFrame({
+        '城市': cities,
+        '日期': pd.to_datetime(policy_df['日期']).to_numpy().astype('datetime64[D]').astype('int64'),
+        '政策': policy_df['政策'].astype(str).to_numpy(),
+    }).reset_index(drop=True)
+
+def build_grid(series):
+    """
+    将各序列放到同一条连续的日期轴上，返回 (起始日, 序列键列表, 二维数组 [序列, 天])
+    没有数据的日期为 NaN；同一日期出现多次时使用第一个值；最后追加一行全为 NaN，供没有数据的城市使用
+    """
+    keys = list(series)
+    present = [days for days, _ in series.values() if len(days)]
+    if not present:
+        return 0, keys, np.full((len(keys) + 1, 1), np.nan)
+    start = min(int(days[0]) for days in present)
+    end = max(int(days[-1]) for days in present)
+    grid = np.full((len(keys) + 1, end - start + 1), np.nan)
+    for row, (days, values) in enumerate(series.values()):
+        unique, first = np.unique(days, return_index=True)
+        grid[row, unique - start] = values[first]
+    return start, keys, grid
+
+def weekday_factors(start, grid):
+    """
+    每个序列各星期几的均值与总体均值之比，返回 [序列, 7]（周一为 0）
+    某个星期几的样本不足或比值无效时为 1，即不调整
+    """
+    weekdays = (np.arange(grid.shape[1]) + start + 3) % 7
+    valid = ~np.isnan(grid)
+    filled = np.where(valid, grid, 0.0)
+    factors = np.ones((grid.shape[0], 7))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        overall = filled.sum(axis=1) / valid.sum(axis=1)
+        for weekday in range(7):
+            columns = weekdays == weekday
+            count = valid[:, columns].sum(axis=1)
+            ratio = filled[:, columns].sum(axis=1) / count / overall
+            usable = (count >= njhouse_metrics.MIN_WEEKDAY_SAMPLES) & np.isfinite(ratio) & (ratio > 0)
+            factors[usable, weekday] = ratio[usable]
+    return factors
+
+def event_windows(start, grid, rows, event_days, pre=PRE_DAYS, post=POST_DAYS):
+    """
+    一次取出所有事件的窗口：rows 为 [事件, 指标] 的序列行号，event_days 为各事件的日期
+    返回 [事件, 指标, pre + post] 的数组，前 pre 天在事件日之前，事件日为第 pre 个；超出数据范围的部分为 NaN
+    """
+    length = pre + post
+    # 两端各补一个窗口长度的 NaN，完全在数据范围外的事件落在补齐的部分
+    padded = np.pad(grid, ((0, 0), (length, length)), constant_values=np.nan)
+    windows = sliding_window_view(padded, length, axis=1)
+    offsets = np.clip(np.asarray(event_days, dtype='int64') - start - pre + length, 0, windows.shape[1] - 1)
+    return windows[rows, offsets[:, None]]
+
+def _masked_moments(values, valid):
+    count = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, values, 0.0).sum(axis=-1) / count
+        var = (np.where(valid, values - mean[..., None], 0.0) ** 2).sum(axis=-1) / (count - 1)
+    return count, mean, var
+
+def abnormal_change(windows, pre=PRE_DAYS, model='mean', min_samples=MIN_SAMPLES):
+    """
+    由星期调整后的窗口计算异常变化，各结果的形状为窗口去掉最后一维
+    mean 模型以政策前均值为基准，t 值为两个窗口均值之差的 Welch t 统计量；
+    trend 模型以政策前的线性趋势外推为基准，t 值按政策前的残差计算
+    """
+    if model not in MODELS:
+        raise ValueError(f"未知的基准模型: {model}，可选: {', '.join(MODELS)}")
+    before, after = windows[..., :pre], windows[..., pre:]
+    valid_before, valid_after = ~np.isnan(before), ~np.isnan(after)
+    n_before, mean_before, var_before = _masked_moments(before, valid_before)
+    n_after, mean_after, var_after = _masked_moments(after, valid_after)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if model == 'mean':
+            baseline = mean_before
+            se = np.sqrt(var_before / n_before + var_after / n_after)
+        else:
+            # 对政策前的有效点做最小二乘拟合 y = a + b * t，t 为相对事件日的天数
+            t_before = np.arange(-pre, 0, dtype='float64')
+            t_after = np.arange(after.shape[-1], dtype='float64')
+            tw = np.where(valid_before, t_before, 0.0)
+            yw = np.where(valid_before, before, 0.0)
+            st, stt, sy, sty = tw.sum(-1), (tw * tw).sum(-1), yw.sum(-1), (tw * yw).sum(-1)
+            slope = (n_before * sty - st * sy) / (n_before * stt - st * st)
+            intercept = (sy - slope * st) / n_before
+            # 政策后各有效日期基准值的平均
+            t_mean_after = np.where(valid_after, t_after, 0.0).sum(-1) / n_after
+            baseline = intercept + slope * t_mean_after
+            residual = np.where(valid_before, before - (intercept[..., None] + slope[..., None] * t_before), 0.0)
+            se = np.sqrt((residual ** 2).sum(-1) / (n_before - 2) / n_after)
+        change = mean_after - baseline
+        result = {
+            '基准': baseline,
+            '实际': mean_after,
+            '异常变化': change,
+            '异常变化率': change / baseline,
+            't值': change / se,
+        }
+    enough = (n_before >= min_samples) & (n_after >= min_samples)
+    for name, values in result.items():
+        values[~enough | ~np.isfinite(values)] = np.nan
+    result['前天数'] = n_before
+    result['后天数'] = n_after
+    return result
+
+def event_study(series, events, pre=PRE_DAYS, post=POST_DAYS, model='mean', metrics=None):
+    """
+    series 为 load_series 的结果，events 为 load_events 的结果
+    返回影响表，每条政策的每个指标一行，按城市、日期排序
+    """
+    metrics = list(metrics or METRICS)
+    start, keys, grid = build_grid(series)
+    # 先按各序列的星期系数调整，再取窗口
+    adjusted = grid / weekday_factors(start, grid)[:, (np.arange(grid.shape[1]) + start + 3) % 7]
+    key_rows = {key: row for row, key in enumerate(keys)}
+    missing = len(keys)
+    rows = np.array([[key_rows.get((city, metric), missing) for metric in metrics] for city in events['城市']],
+                    dtype='int64').reshape(len(events), len(metrics))
+    windows = event_windows(start, adjusted, rows, events['日期'].to_numpy(), pre, post)
+    result = abnormal_change(windows, pre, model)
+
+    table = pd.DataFrame({
+        '城市': np.repeat(events['城市'].to_numpy(), len(metrics)),
+        '日期': np.repeat(events['日期'].to_numpy().astype('datetime64[D]').astype(str), len(metrics)),
+        '政策': np.repeat(events['政策'].to_numpy(), len(metrics)),
+        '指标': np.tile(metrics, len(events)),
+        **{name: values.ravel() for name, values in result.items()},
+    }, columns=IMPACT_COLUMNS)
+    return table.sort_values(['城市', '日期'], kind='stable').reset_index(drop=True)
+
+def save_impact(table, path=IMPACT_CSV_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.round({'基准': 4, '实际': 4, '异常变化': 4, '异常变化率': 4, 't值': 2}).to_csv(
+        path, index=False, encoding='utf-8-sig')
+    print(f"政策影响表已保存为 {path}")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='计算每条政策前后各指标的异常变化')
+    parser.add_argument('--pre', type=int, default=PRE_DAYS, help='政策前窗口的天数')
+    parser.add_argument('--post', type=int, default=POST_DAYS, help='政策后窗口的天数（含政策当天）')
+    parser.add_argument('--model', choices=MODELS, default='mean', help='基准模型')
+    parser.add_argument('--output', default=IMPACT_CSV_PATH, help='影响表的输出路径')
+    args = parser.parse_args()
+
+    impact = event_study(load_series(), load_events(), args.pre, args.post, args.model)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(impact.to_string(index=False))
+    save_impact(impact, args.output)
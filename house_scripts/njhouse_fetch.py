@@ -0,0 +1,72 @@
+# 异步抓取：共享连接池，每个请求有超时，失败时按指数退避重试，多个页面并发抓取
+
+import time
+import asyncio
+import requests
+import pipeline_trace
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+# 连接超时和读取超时（秒）
+DEFAULT_TIMEOUT = (5, 15)
+# 这些状态码通常是临时故障，值得重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    pass
+
+def create_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+async def fetch_text(session, url, timeout=DEFAULT_TIMEOUT, retries=3, backoff=1.0, encoding='utf-8'):
+    """抓取单个页面，返回文本；重试用尽后抛出 FetchError"""
+    for attempt in range(retries + 1):
+        try:
+            # requests 是阻塞调用，放到线程中执行，事件循环可同时处理其他请求
+            start = time.perf_counter()
+            try:
+                response = await asyncio.to_thread(session.get, url, timeout=timeout)
+            except requests.RequestException as e:
+                pipeline_trace.record('http', url=url, attempt=attempt + 1, error=str(e),
+                                      latency=time.perf_counter() - start)
+                raise
+            pipeline_trace.record('http', url=url, attempt=attempt + 1, status=response.status_code,
+                                  latency=time.perf_counter() - start, bytes=len(response.content))
+            if response.status_code in RETRY_STATUS:
+                raise FetchError(f"{url} 返回状态码 {response.status_code}")
+            response.raise_for_status()
+            response.encoding = encoding
+            return response.text
+        except (requests.RequestException, FetchError) as e:
+            # 4xx 等非临时错误不重试
+            if isinstance(e, requests.HTTPError) or attempt == retries:
+                raise FetchError(f"抓取 {url} 失败: {str(e)}") from e
+            delay = backoff * (2 ** attempt)
+            print(f"抓取 {url} 失败，{delay:.1f} 秒后重试: {str(e)}")
+            await asyncio.sleep(delay)
+
+async def fetch_all(urls, concurrency=4, **kwargs):
+    """并发抓取多个页面，返回 {url: 文本或 FetchError}"""
+    semaphore = asyncio.Semaphore(concurrency)
+    session = create_session(pool_size=concurrency)
+
+    async def fetch_one(url):
+        async with semaphore:
+            return await fetch_text(session, url, **kwargs)
+
+    try:
+        results = await asyncio.gather(*(fetch_one(url) for url in urls), return_exceptions=True)
+    finally:
+        session.close()
+    return dict(zip(urls, results))
+
+def fetch_pages(urls, concurrency=4, **kwargs):
+    """同步调用入口，供脚本直接使用"""
+    return asyncio.run(fetch_all(list(urls), concurrency=concurrency, **kwargs))
@@ -0,0 +1,229 @@
+# 派生指标：滚动成交量、挂牌量变化、去化周期、星期调整成交量、降涨比
+# 新增一天的数据时只更新滑动窗口，计算状态与结果一起保存在派生指标表中；
+# 源数据存储被整体重写（修订号变化）或最近一段已计算过的数据被修改时整体重算
+# 用法: python njhouse_metrics.py [--rebuild]
+
+import os
+import json
+import hashlib
+import argparse
+from collections import deque
+import numpy as np
+import pandas as pd
+import njhouse_data
+import njhouse_stock
+import njhouse_store
+
+# 修改指标的计算方式后递增版本号，下次更新时会整体重算
+METRICS_VERSION = 3
+# 每个星期几至少有这么多天的数据，才计算星期调整成交量
+MIN_WEEKDAY_SAMPLES = 4
+# 每次更新时核对最近这么多天已计算过的源数据，覆盖最长的滑动窗口；更早的数据被修改时由源数据的修订号发现
+TAIL_DAYS = 31
+
+STOCK_METRICS_DIR = njhouse_store.partition_dir(njhouse_stock.STORE_ROOT, 'nanjing', 'stock_metrics')
+BK_METRICS_DIR = njhouse_store.partition_dir(njhouse_stock.STORE_ROOT, 'nanjing', 'bk_metrics')
+
+STOCK_METRICS_SCHEMA = [
+    ('日期', 'date', 'int32'),
+    ('7日成交量', 'volume_7d', 'int32'),
+    ('30日成交量', 'volume_30d', 'int32'),
+    ('挂牌变化', 'inventory_change', 'int32'),
+    ('去化周期(月)', 'months_of_supply', 'float64'),
+    ('星期调整成交量', 'weekday_adjusted_volume', 'float64'),
+]
+BK_METRICS_SCHEMA = [
+    ('日期', 'date', 'int32'),
+    ('价格变动比', 'price_change_ratio', 'float64'),
+]
+
+class RollingSum:
+    """按自然日滑动的窗口和，每次只移出过期的数据，缺失的日期不影响窗口范围"""
+
+    def __init__(self, window, items=()):
+        self.window = window
+        self.items = deque(tuple(item) for item in items)
+        self.total = sum(value for _, value in self.items)
+
+    def push(self, days, value):
+        if value is not None:
+            self.items.append((days, value))
+            self.total += value
+        while self.items and self.items[0][0] <= days - self.window:
+            self.total -= self.items.popleft()[1]
+        return self.total if self.items else None
+
+    def state(self):
+        return list(self.items)
+
+class StockMetrics:
+    """南京挂牌房源数据的派生指标，每次输入一天的数据"""
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.volume_7d = RollingSum(7, state.get('volume_7d', []))
+        self.volume_30d = RollingSum(30, state.get('volume_30d', []))
+        self.last_total = state.get('last_total')
+        # 各星期几的成交量累计，用于计算星期系数
+        self.weekday_sum = state.get('weekday_sum', [0] * 7)
+        self.weekday_count = state.get('weekday_count', [0] * 7)
+
+    def update(self, days, row):
+        total = row['总挂牌房源']
+        volume = row['昨日住宅成交量']
+        volume_30d = self.volume_30d.push(days, volume)
+        result = {
+            '7日成交量': self.volume_7d.push(days, volume),
+            '30日成交量': volume_30d,
+            '挂牌变化': total - self.last_total if total is not None and self.last_total is not None else None,
+            # 按最近 30 天的成交速度，消化当前挂牌量需要的月数
+            '去化周期(月)': round(total / volume_30d, 2) if total is not None and volume_30d else None,
+            '星期调整成交量': None,
+        }
+        if total is not None:
+            self.last_total = total
+
+        if volume is not None:
+            # 1970-01-01 是周四，换算为周一为 0
+            weekday = (days + 3) % 7
+            self.weekday_sum[weekday] += volume
+            self.weekday_count[weekday] += 1
+            weekday_mean = self.weekday_sum[weekday] / self.weekday_count[weekday]
+            overall_mean = sum(self.weekday_sum) / sum(self.weekday_count)
+            if self.weekday_count[weekday] >= MIN_WEEKDAY_SAMPLES and weekday_mean > 0:
+                result['星期调整成交量'] = round(volume * overall_mean / weekday_mean, 2)
+        return result
+
+    def state(self):
+        return {
+            'volume_7d': self.volume_7d.state(),
+            'volume_30d': self.volume_30d.state(),
+            'last_total': self.last_total,
+            'weekday_sum': self.weekday_sum,
+            'weekday_count': self.weekday_count,
+        }
+
+class BkMetrics:
+    """贝壳数据的派生指标，降涨比只依赖当天的数据"""
+
+    def __init__(self, state=None):
+        pass
+
+    def update(self, days, row):
+        up, down = row['涨价房源'], row['降价房源']
+        return {'价格变动比': round(down / up, 4) if up and down is not None else None}
+
+    def state(self):
+        return {}
+
+def _clean(value):
+    """源数据中的缺失值（存储的哨兵值、NaN）统一为 None，其余转为 Python 整数"""
+    if value is None or value == njhouse_store.MISSING or pd.isna(value):
+        return None
+    return int(value)
+
+def tail_fingerprint(days, columns, last_days):
+    """
+    源数据中已计算过的最后 TAIL_DAYS 天（日期和用到的列）的 sha256，缺失值统一为 NaN
+    days 为升序，用二分查找定位，只读取这一小段数据
+    """
+    if last_days is None:
+        return None
+    lo = int(np.searchsorted(days, last_days - TAIL_DAYS, side='right'))
+    hi = int(np.searchsorted(days, last_days, side='right'))
+    h = hashlib.sha256(np.asarray(days[lo:hi], dtype=np.int64).tobytes())
+    for column in sorted(columns):
+        values = pd.to_numeric(pd.Series(np.asarray(columns[column][lo:hi])), errors='coerce').to_numpy(dtype='float64', copy=True)
+        values[(values == njhouse_store.MISSING) | np.isnan(values)] = np.nan
+        h.update(column.encode('utf-8'))
+        h.update(values.tobytes())
+    return h.hexdigest()
+
+def load_state(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'state.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_state(store_dir, state):
+    path = os.path.join(store_dir, 'state.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def update_table(store_dir, schema, csv_path, engine_cls, days, columns, rebuild=False, revision=None):
+    """
+    增量更新派生指标表：days 为源数据各行的日期（1970-01-01 起的天数，升序），columns 为 {列名: 各行的值}
+    只计算上次更新之后的日期；以下情况整体重算：指标版本变化、源数据中插入了更早的日期、
+    源数据的修订号 revision（如列式存储被整体重写时递增的修订号）变化、最近 TAIL_DAYS 天已计算过的数值被修改。
+    没有修订号的源数据（如手工维护的 CSV）中更早的数值被修改时，需要用 rebuild=True 重算。返回新增的行数
+    """
+    days = np.asarray(days, dtype=np.int64)
+    state = None if rebuild else load_state(store_dir)
+    if state and (state['version'] != METRICS_VERSION or not njhouse_store.store_exists(store_dir)):
+        state = None
+    last_days = state['last_days'] if state else None
+    new = np.arange(len(days)) if last_days is None else np.flatnonzero(days > last_days)
+    if state and len(days) - len(new) != state['count']:
+        # 源数据中插入了更早的日期，无法增量计算
+        state, last_days, new = None, None, np.arange(len(days))
+    elif state and (state.get('revision') != revision
+                    or tail_fingerprint(days, columns, last_days) != state.get('tail')):
+        # 已计算过的日期的数值被修改（如手工更正 CSV 后重新导入），之后的滑动窗口也随之变化
+        print(f"源数据中已计算过的数值被修改，{csv_path} 整体重算")
+        state, last_days, new = None, None, np.arange(len(days))
+
+    engine = engine_cls(state['engine'] if state else None)
+    rows = []
+    for i in new[np.argsort(days[new], kind='stable')]:
+        # 同一日期出现多次时只使用第一行
+        if last_days is not None and days[i] <= last_days:
+            continue
+        last_days = int(days[i])
+        row = engine.update(last_days, {column: _clean(values[i]) for column, values in columns.items()})
+        row['日期'] = str(np.datetime64(last_days, 'D'))
+        rows.append(row)
+
+    if state:
+        for row in rows:
+            njhouse_store.append_row(store_dir, row)
+    else:
+        os.makedirs(store_dir, exist_ok=True)
+        njhouse_store.write_rows(store_dir, pd.DataFrame(rows, columns=[column for column, _, _ in schema]), schema)
+    if rows or not state or not os.path.exists(csv_path):
+        njhouse_store.export_csv(store_dir, csv_path)
+    save_state(store_dir, {'version': METRICS_VERSION, 'last_days': last_days, 'count': len(days),
+                           'revision': revision, 'tail': tail_fingerprint(days, columns, last_days),
+                           'engine': engine.state()})
+    return len(rows)
+
+def update_stock_metrics(source_dir=njhouse_stock.STOCK_STORE_DIR, rebuild=False):
+    """从挂牌房源存储中只读取日期列和用到的两列"""
+    schema = njhouse_store.load_schema(source_dir)
+    columns = {column: njhouse_store.read_column(source_dir, column, schema)
+               for column in ('总挂牌房源', '昨日住宅成交量')}
+    days = njhouse_store.read_column(source_dir, '日期', schema)
+    return update_table(STOCK_METRICS_DIR, STOCK_METRICS_SCHEMA, njhouse_data.STOCK_METRICS_CSV_PATH,
+                        StockMetrics, days, columns, rebuild, njhouse_store.store_revision(source_dir))
+
+def update_bk_metrics(csv_path=njhouse_data.BK_CSV_PATH, rebuild=False):
+    df = njhouse_data.load_bk(csv_path)
+    days = df['日期'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    columns = {column: df[column].to_numpy() for column in ('涨价房源', '降价房源')}
+    return update_table(BK_METRICS_DIR, BK_METRICS_SCHEMA, njhouse_data.BK_METRICS_CSV_PATH,
+                        BkMetrics, days, columns, rebuild)
+
+def update_all(rebuild=False):
+    added = {
+        'stock': update_stock_metrics(rebuild=rebuild),
+        'bk': update_bk_metrics(rebuild=rebuild),
+    }
+    print(f"派生指标已更新：挂牌房源新增 {added['stock']} 天，贝壳数据新增 {added['bk']} 天")
+    return added
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='增量更新派生指标表')
+    parser.add_argument('--rebuild', action='store_true', help='忽略保存的状态，全部重新计算')
+    args = parser.parse_args()
+    update_all(rebuild=args.rebuild)
@@ -1,48 +1,132 @@
-import requests
-from bs4 import BeautifulSoup
+import re
+import njhouse_fetch
 import os
-from datetime import datetime, timedelta
-import pytz
-import pandas as pd
+from datetime import datetime, timedelta, timezone
+import njhouse_store
 
-# 切换到脚本所在目录
 script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
 
-def get_house_data():
-    url = "http://njzl.njhouse.com.cn/stock"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+STOCK_CSV_PATH = os.path.join(script_dir, 'njhouse_stock_daily', 'njhouse_stock_daily.csv')
+# 按 城市/数据源 分区的列式存储根目录
+STORE_ROOT = os.path.join(script_dir, 'njhouse_stock_daily', 'store')
+STOCK_STORE_DIR = njhouse_store.partition_dir(STORE_ROOT, 'nanjing', 'njhouse_stock')
+STOCK_URL = os.getenv('NJHOUSE_STOCK_URL', "http://njzl.njhouse.com.cn/stock")
+
+HOUSE_DATA_LABELS = ['总挂牌房源', '中介挂牌房源', '个人挂牌房源', '昨日住宅成交量']
+# 页面中没有该标签时写入 CSV 的文字，与原有的抓取结果一致；标签存在但值为空（如周日的成交量）时写入空值
+MISSING_TEXT = '未找到'
+# 一次扫描找出所有 "标签：数字" 形式的 span
+HOUSE_DATA_PATTERN = re.compile(
+    r'<span[^>]*>\s*(' + '|'.join(HOUSE_DATA_LABELS) + r')\s*[：:]\s*([\d,]+)'
+)
+
+def _to_int(value):
+    try:
+        return int(value.replace(',', '').strip())
+    except (AttributeError, ValueError):
+        return None
+
+def _parse_span_texts(texts):
+    """遍历一次 span 文本，收集所有标签对应的数值"""
+    data = {}
+    for text in texts:
+        text = str(text).strip()
+        for label in HOUSE_DATA_LABELS:
+            if label not in data and text.startswith(label):
+                parts = re.split('[：:]', text, maxsplit=1)
+                if len(parts) == 2:
+                    data[label] = _to_int(parts[1])
+                break
+    return data
+
+def parse_house_data_bs4(html):
+    """原有的解析方式：BeautifulSoup 对每个标签各做一次全树查找，仅用于对比测试"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # 直接查找包含特定文本的span标签
+    total = soup.find('span', string=lambda x: '总挂牌房源' in str(x))
+    agency = soup.find('span', string=lambda x: '中介挂牌房源' in str(x))
+    personal = soup.find('span', string=lambda x: '个人挂牌房源' in str(x))
+    yesterday = soup.find('span', string=lambda x: '昨日住宅成交量' in str(x))
+    
+    data = {
+        '总挂牌房源': total.text.split('：')[1].strip() if total else '未找到',
+        '中介挂牌房源': agency.text.split('：')[1].strip() if agency else '未找到',
+        '个人挂牌房源': personal.text.split('：')[1].strip() if personal else '未找到',
+        '昨日住宅成交量': yesterday.text.split('：')[1].strip() if yesterday else '未找到'
     }
+    return data
+
+def parse_house_data(html, backend='regex'):
+    """
+    解析页面中的四项数据，返回整数，未找到的项为 None
+    backend: 'regex' 用一个预编译正则扫描一遍原始 HTML；'lxml' 用 lxml 解析后遍历一次 span（需安装 lxml）
+    两种方式都没找到全部标签时，退回到 BeautifulSoup 遍历一次 span
+    """
+    data = {}
+    if backend == 'lxml':
+        try:
+            import lxml.html
+            data = _parse_span_texts(lxml.html.fromstring(html).xpath('//span/text()'))
+        except ImportError:
+            backend = 'regex'
+    if backend == 'regex':
+        for label, value in HOUSE_DATA_PATTERN.findall(html):
+            data.setdefault(label, _to_int(value))
     
+    # 页面结构变化（如 span 中嵌套了其他标签）时，用完整解析再找一次
+    if len(data) < len(HOUSE_DATA_LABELS):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, 'html.parser')
+        data = {**_parse_span_texts(span.get_text() for span in soup.find_all('span')), **data}
+    
+    return {label: data.get(label) for label in HOUSE_DATA_LABELS}
+
+def get_house_data_many(urls, concurrency=4, **kwargs):
+    """
+    并发抓取并解析多个页面（如各区页面），返回 {url: 数据字典或错误信息}
+    没有解析出的项按原有的 CSV 格式表示：页面中没有该标签时为"未找到"，有标签但没有数值时为空字符串
+    """
+    pages = njhouse_fetch.fetch_pages(urls, concurrency=concurrency, **kwargs)
+    results = {}
+    for url, page in pages.items():
+        if isinstance(page, Exception):
+            print(f"错误详情: {str(page)}")
+            results[url] = f"获取数据时发生错误: {str(page)}"
+        else:
+            data = parse_house_data(page)
+            results[url] = {label: MISSING_TEXT if value is None and label not in page else ('' if value is None else value)
+                            for label, value in data.items()}
+    return results
+
+def get_house_data(url=STOCK_URL, **kwargs):
     try:
-        response = requests.get(url, headers=headers)
-        response.encoding = 'utf-8'
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 直接查找包含特定文本的span标签
-        total = soup.find('span', string=lambda x: '总挂牌房源' in str(x))
-        agency = soup.find('span', string=lambda x: '中介挂牌房源' in str(x))
-        personal = soup.find('span', string=lambda x: '个人挂牌房源' in str(x))
-        yesterday = soup.find('span', string=lambda x: '昨日住宅成交量' in str(x))
-        
-        data = {
-            '总挂牌房源': total.text.split('：')[1].strip() if total else '未找到',
-            '中介挂牌房源': agency.text.split('：')[1].strip() if agency else '未找到',
-            '个人挂牌房源': personal.text.split('：')[1].strip() if personal else '未找到',
-            '昨日住宅成交量': yesterday.text.split('：')[1].strip() if yesterday else '未找到'
-        }
-        return data
-            
+        return get_house_data_many([url], **kwargs)[url]
     except Exception as e:
         print(f"错误详情: {str(e)}")
         return f"获取数据时发生错误: {str(e)}"
 
+def ensure_stock_store():
+    """
+    确保列式存储存在，首次运行时从已有的 CSV 初始化，返回存储目录
+    CSV 在上次导出后被手工修改过时，以 CSV 为准重新导入，修改不会被下一次导出覆盖
+    """
+    os.makedirs(os.path.dirname(STOCK_CSV_PATH), exist_ok=True)
+    if not njhouse_store.store_exists(STOCK_STORE_DIR):
+        if os.path.exists(STOCK_CSV_PATH):
+            njhouse_store.import_csv(STOCK_STORE_DIR, STOCK_CSV_PATH, njhouse_store.STOCK_SCHEMA)
+        else:
+            njhouse_store.create_store(STOCK_STORE_DIR, njhouse_store.STOCK_SCHEMA)
+    elif njhouse_store.csv_modified(STOCK_STORE_DIR, STOCK_CSV_PATH):
+        print(f"{STOCK_CSV_PATH} 在上次导出后被修改，重新导入")
+        njhouse_store.import_csv(STOCK_STORE_DIR, STOCK_CSV_PATH, njhouse_store.STOCK_SCHEMA)
+    return STOCK_STORE_DIR
+
 def save_data_to_csv(data):
     try:
-        # 获取北京时间
-        beijing_tz = pytz.timezone('Asia/Shanghai')
+        # 获取北京时间（UTC+8）
+        beijing_tz = timezone(timedelta(hours=8))
         current_time = datetime.now(beijing_tz)
         # 获取前一天的日期
         yesterday = current_time - timedelta(days=1)
@@ -60,27 +144,18 @@ def save_data_to_csv(data):
         }
         weekday = weekday_map[yesterday.weekday()]
         
-        # 创建目录
-        save_dir = 'njhouse_stock_daily'
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-        
-        # CSV文件路径
-        csv_path = os.path.join(save_dir, 'njhouse_stock_daily.csv')
+        csv_path = STOCK_CSV_PATH
+        store_dir = ensure_stock_store()
         
         # 准备新数据
         data['日期'] = date_str
         data['周几'] = weekday
-        df_new = pd.DataFrame([data])
         
-        # 如果文件存在，读取现有数据并将新数据放在最上面
-        if os.path.exists(csv_path):
-            df_existing = pd.read_csv(csv_path, encoding='utf-8-sig')
-            df_combined = pd.concat([df_new, df_existing], ignore_index=True)
-            df_combined.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        # 追加新数据，日期重复时不写入，CSV 仅在数据变化时重新导出
+        if njhouse_store.append_row(store_dir, data) or not os.path.exists(csv_path):
+            njhouse_store.export_csv(store_dir, csv_path)
         else:
-            # 如果文件不存在，直接创建新文件
-            df_new.to_csv(csv_path, index=False, encoding='utf-8-sig')
+            print(f"{date_str} 的数据已存在，跳过写入")
             
         return csv_path
     except Exception as e:
@@ -88,7 +163,12 @@ def save_data_to_csv(data):
         return None
 
 def clean_duplicate_data(csv_path):
-    # 检查并删除重复日期的数据
+    # 检查并删除重复日期的数据，写入时已去重，通常只需读取日期列
+    import pandas as pd
+    dates = pd.read_csv(csv_path, encoding='utf-8-sig', usecols=['日期'])['日期']
+    if not dates.duplicated().any():
+        print("数据无重复日期，无需清洗。")
+        return
     df = pd.read_csv(csv_path, encoding='utf-8-sig')
     # 使用drop_duplicates方法删除重复的日期数据，保留最新的数据
     df.drop_duplicates(subset=['日期'], keep='last', inplace=True)
@@ -109,8 +189,5 @@ if __name__ == "__main__":
             print(f"\n数据已成功保存到 {csv_path}")
         else:
             print("\n数据保存失败")
-
-        # 清洗数据
-        clean_duplicate_data(csv_path)
     else:
         print(result)
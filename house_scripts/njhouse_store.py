@@ -0,0 +1,299 @@
+# 列式存储：每列一个定长二进制文件，新数据追加写入；CSV 由存储导出，CSV 被手工修改后会在下次写入前重新导入
+
+import os
+import io
+import csv
+import json
+import hashlib
+import numpy as np
+
+# 日期列以 1970-01-01 起的天数保存，缺失的整数值用该哨兵值表示，缺失的浮点值为 NaN
+MISSING = np.iinfo(np.int32).min
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+# 整数列中与导出格式不同的原始文字（如抓取失败时写入的"未找到"），按 {日期: {列名: 文字}} 保存，导出时原样写回
+TEXT_FILE = 'text.json'
+# 最近一次导出（或导入）时 CSV 的哈希，用于发现 CSV 被手工修改
+EXPORT_STATE_FILE = 'export.json'
+# 存储的修订号，整体重写（导入、合并）时递增，追加新行时不变；派生指标据此发现已有数据被修改
+REVISION_FILE = 'revision.json'
+
+# 南京挂牌房源数据的列定义：(列名, 文件名, 类型)
+STOCK_SCHEMA = [
+    ('日期', 'date', 'int32'),
+    ('总挂牌房源', 'total', 'int32'),
+    ('中介挂牌房源', 'agency', 'int32'),
+    ('个人挂牌房源', 'personal', 'int32'),
+    ('昨日住宅成交量', 'volume', 'int32'),
+]
+
+# 贝壳每日截图识别结果的列定义
+BK_OCR_SCHEMA = [
+    ('日期', 'date', 'int32'),
+    ('成交均价', 'avg_price', 'int32'),
+    ('成交量', 'volume', 'int32'),
+    ('新增挂牌', 'new_listings', 'int32'),
+    ('涨价房源', 'price_up', 'int32'),
+    ('降价房源', 'price_down', 'int32'),
+    ('看房人数', 'viewers', 'int32'),
+    ('看房量', 'viewings', 'int32'),
+    ('成交周期', 'cycle_days', 'int32'),
+]
+
+def _date_to_days(date_str):
+    return int(np.datetime64(str(date_str)[:10], 'D').astype(np.int64))
+
+def _to_int(value):
+    # 无法解析的值（如"未找到"）记为缺失
+    try:
+        return int(float(str(value).replace(',', '').strip()))
+    except (TypeError, ValueError):
+        return MISSING
+
+def _to_value(value, dtype):
+    if np.issubdtype(np.dtype(dtype), np.floating):
+        try:
+            return float(str(value).replace(',', '').strip())
+        except (TypeError, ValueError):
+            return np.nan
+    return _to_int(value)
+
+def _original_text(value, dtype):
+    """
+    整数值在 CSV 中的原始文字与导出格式不同时（如"未找到"、旧数据中的"51.0"）返回原始文字，
+    空值、与导出格式相同的数字及浮点列返回 None
+    """
+    if np.issubdtype(np.dtype(dtype), np.floating) or not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    number = _to_int(text)
+    return text if number == MISSING or str(number) != text else None
+
+def load_texts(store_dir):
+    try:
+        with open(os.path.join(store_dir, TEXT_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_texts(store_dir, texts):
+    path = os.path.join(store_dir, TEXT_FILE)
+    if not texts:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(texts.items())), f, ensure_ascii=False, indent=2)
+
+def partition_dir(root, city, source):
+    """分区存储的目录：每个城市的每个数据源各自一个存储"""
+    return os.path.join(root, city, source)
+
+def load_schema(store_dir):
+    with open(os.path.join(store_dir, 'schema.json'), encoding='utf-8') as f:
+        return [tuple(item) for item in json.load(f)]
+
+def create_store(store_dir, schema):
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, 'schema.json'), 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    for _, file_name, _ in schema:
+        open(os.path.join(store_dir, f'{file_name}.bin'), 'ab').close()
+
+def store_revision(store_dir):
+    try:
+        with open(os.path.join(store_dir, REVISION_FILE), encoding='utf-8') as f:
+            return json.load(f)['revision']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return 0
+
+def _bump_revision(store_dir):
+    with open(os.path.join(store_dir, REVISION_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'revision': store_revision(store_dir) + 1}, f)
+
+def store_exists(store_dir):
+    return os.path.exists(os.path.join(store_dir, 'schema.json'))
+
+def row_count(store_dir, schema=None):
+    schema = schema or load_schema(store_dir)
+    # 以最短的列为准，追加中途中断时多出的半行会被忽略
+    counts = [os.path.getsize(os.path.join(store_dir, f'{file_name}.bin')) // np.dtype(dtype).itemsize
+              for _, file_name, dtype in schema]
+    return min(counts)
+
+def read_column(store_dir, name, schema=None):
+    """以内存映射方式读取单列，返回 numpy 数组"""
+    schema = schema or load_schema(store_dir)
+    for column, file_name, dtype in schema:
+        if column == name:
+            n = row_count(store_dir, schema)
+            if n == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(os.path.join(store_dir, f'{file_name}.bin'), dtype=dtype, mode='r', shape=(n,))
+    raise KeyError(name)
+
+def has_date(store_dir, date_str, schema=None):
+    """存储中是否已有该日期；存储始终按日期升序（append_row 遇到更早的日期时整体重写）"""
+    days = read_column(store_dir, '日期', schema)
+    if len(days) == 0:
+        return False
+    target = _date_to_days(date_str)
+    # 每日按时间顺序追加，新日期大于最后一行时无需扫描整列
+    if target > days[-1]:
+        return False
+    return bool((days == target).any())
+
+def append_row(store_dir, row):
+    """
+    追加一行数据，日期已存在时保留原有数据，返回是否写入
+    日期早于最后一行时改为排序后整体重写，保持存储按日期升序
+    """
+    schema = load_schema(store_dir)
+    if has_date(store_dir, row['日期'], schema):
+        return False
+    days = read_column(store_dir, '日期', schema)
+    if len(days) and _date_to_days(row['日期']) < days[-1]:
+        del days
+        return merge_rows(store_dir, [row]) > 0
+
+    texts = {column: text for column, _, dtype in schema if column != '日期'
+             for text in [_original_text(row.get(column), dtype)] if text}
+    if texts:
+        _save_texts(store_dir, {**load_texts(store_dir), str(row['日期'])[:10]: texts})
+
+    n = row_count(store_dir, schema)
+    for column, file_name, dtype in schema:
+        value = _date_to_days(row[column]) if column == '日期' else _to_value(row.get(column), dtype)
+        with open(os.path.join(store_dir, f'{file_name}.bin'), 'r+b') as f:
+            # 从有效行末尾写入，覆盖可能残留的半行
+            f.seek(n * np.dtype(dtype).itemsize)
+            f.write(np.array([value], dtype=dtype).tobytes())
+            f.truncate()
+    return True
+
+def write_rows(store_dir, df, schema, texts=None):
+    """
+    用 DataFrame 整体重写存储，按日期排序并去重，存储的修订号加一
+    texts 为保留的原始文字（如合并前存储中已有的），DataFrame 中无法解析的文字会加入其中
+    """
+    create_store(store_dir, schema)
+    df = df.copy()
+    df['_days'] = [_date_to_days(d) for d in df['日期']]
+    df = df.drop_duplicates(subset=['_days'], keep='first').sort_values('_days')
+    dates = [str(np.datetime64(d, 'D')) for d in df['_days']]
+    kept = set(dates)
+    texts = {date: columns for date, columns in (texts or {}).items() if date in kept}
+    for column, _, dtype in schema:
+        if column != '日期' and column in df:
+            for date, value in zip(dates, df[column]):
+                text = _original_text(value, dtype)
+                if text:
+                    texts.setdefault(date, {})[column] = text
+    _save_texts(store_dir, texts)
+    for column, file_name, dtype in schema:
+        if column == '日期':
+            values = df['_days'].to_numpy()
+        else:
+            values = [_to_value(v, dtype) for v in df[column]] if column in df else [_to_value(None, dtype)] * len(df)
+        with open(os.path.join(store_dir, f'{file_name}.bin'), 'wb') as f:
+            f.write(np.asarray(values, dtype=dtype).tobytes())
+    _bump_revision(store_dir)
+
+def merge_rows(store_dir, rows):
+    """将多行数据合并进存储，已有的日期保留原数据，排序去重后一次写入，返回新增的行数"""
+    import pandas as pd
+    schema = load_schema(store_dir)
+    existing = read_store(store_dir)
+    before = len(existing)
+    existing['日期'] = existing['日期'].dt.strftime('%Y-%m-%d')
+    combined = pd.concat([existing, pd.DataFrame(rows)], ignore_index=True)
+    write_rows(store_dir, combined, schema, load_texts(store_dir))
+    return row_count(store_dir, schema) - before
+
+def import_csv(store_dir, csv_path, schema):
+    """从已有的 CSV 文件初始化存储"""
+    import pandas as pd
+    df = pd.read_csv(csv_path, encoding='utf-8-sig', dtype=str)
+    # 旧 CSV 新数据在最上面，去重时保留最早写入（最下面）的一行，与 clean_duplicate_data 一致
+    df = df.iloc[::-1]
+    write_rows(store_dir, df, schema)
+    # 导入后存储与该 CSV 一致
+    with open(csv_path, 'rb') as f:
+        _save_export_state(store_dir, hashlib.sha256(f.read()).hexdigest())
+
+def read_store(store_dir):
+    """读取全部数据为 DataFrame，按日期升序，整数列为可空整数类型，浮点列缺失值为 NaN"""
+    import pandas as pd
+    schema = load_schema(store_dir)
+    data = {}
+    for column, _, dtype in schema:
+        values = np.array(read_column(store_dir, column, schema))
+        if column == '日期':
+            data[column] = pd.to_datetime(values.astype('datetime64[D]'))
+        elif np.issubdtype(values.dtype, np.floating):
+            data[column] = values
+        else:
+            data[column] = pd.array(np.where(values == MISSING, pd.NA, values), dtype='Int32' if dtype == 'int32' else 'Int64')
+    df = pd.DataFrame(data).sort_values('日期', ignore_index=True)
+    df['周几'] = [WEEKDAY_NAMES[d] for d in df['日期'].dt.dayofweek]
+    return df
+
+def _format(value, dtype, text):
+    if np.issubdtype(np.dtype(dtype), np.floating):
+        return '' if np.isnan(value) else repr(float(value))
+    # 原始文字只在与存储中的值一致时使用，值被合并的新数据覆盖后不再使用
+    if text is not None and _to_int(text) == value:
+        return text
+    return '' if value == MISSING else str(int(value))
+
+def _save_export_state(store_dir, digest):
+    with open(os.path.join(store_dir, EXPORT_STATE_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'sha256': digest}, f)
+
+def render_csv(store_dir):
+    """
+    生成仓库中可读的 CSV 内容：数值列在前，日期、周几在后，新数据在最上面
+    缺失值写为空，写入时带有原始文字（如"未找到"）的写回原始文字；直接从列文件生成，无需导入 pandas
+    """
+    schema = load_schema(store_dir)
+    days = np.array(read_column(store_dir, '日期', schema))
+    order = np.argsort(days, kind='stable')[::-1]
+    value_columns = [(column, np.array(read_column(store_dir, column, schema))[order], dtype)
+                     for column, _, dtype in schema if column != '日期']
+
+    # 与 pandas.DataFrame.to_csv 的默认格式一致
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=os.linesep)
+    writer.writerow([column for column, _, _ in value_columns] + ['日期', '周几'])
+    texts = load_texts(store_dir)
+    for i, d in enumerate(days[order].tolist()):
+        date = str(np.datetime64(d, 'D'))
+        row_texts = texts.get(date, {})
+        writer.writerow([_format(values[i], dtype, row_texts.get(column)) for column, values, dtype in value_columns]
+                        + [date, WEEKDAY_NAMES[(d + 3) % 7]])
+    return buffer.getvalue().encode('utf-8-sig')
+
+def export_csv(store_dir, csv_path):
+    """
+    导出为 CSV 并记录内容的哈希；存储是数据的来源，导出会覆盖 CSV，
+    手工修改过的 CSV 需要先用 csv_modified 检查并 import_csv 导入
+    """
+    content = render_csv(store_dir)
+    with open(csv_path, 'wb') as f:
+        f.write(content)
+    _save_export_state(store_dir, hashlib.sha256(content).hexdigest())
+    return csv_path
+
+def csv_modified(store_dir, csv_path):
+    """
+    CSV 是否在最近一次导出或导入之后被修改过（如手工编辑）
+    没有导出记录时（较早生成的存储）与存储当前的导出结果比较
+    """
+    if not os.path.exists(csv_path):
+        return False
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    try:
+        with open(os.path.join(store_dir, EXPORT_STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)['sha256'] != digest
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return hashlib.sha256(render_csv(store_dir)).hexdigest() != digest
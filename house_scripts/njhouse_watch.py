@@ -0,0 +1,259 @@
+# 常驻监视模式：解释器、字体、绘图模块和数据集常驻内存，监视截图目录和数据文件，
+# 新截图到达后只识别这一张，追加到数据文件，增量更新派生指标，只重绘受影响的图表，几秒内即可看到新图表
+# Linux 上通过 inotify 等待文件变化，其他系统或 inotify 不可用时定时扫描；启动前已有的截图请用 nj_bk_daily.py 批量识别
+# 用法: python njhouse_watch.py [截图目录...] [--interval 2] [--no-initial]
+
+import os
+import sys
+import time
+import select
+import argparse
+import importlib
+import ctypes
+import ctypes.util
+import njhouse_data
+import njhouse_stock
+import daily_jobs
+from daily_pipeline import run_pipeline
+
+# 没有 inotify 时扫描目录的间隔（秒）
+WATCH_INTERVAL = float(os.getenv('WATCH_INTERVAL', '2'))
+# 有 inotify 时的兜底扫描间隔（秒），防止漏掉事件（如网络文件系统上的变化）
+IDLE_INTERVAL = 60
+# 文件修改后至少经过这么久且大小不再变化才处理，避免读到正在复制或同步的截图
+SETTLE_SECONDS = 1.0
+# 数据文件: 受影响的数据类型
+DATA_FILES = {
+    njhouse_stock.STOCK_CSV_PATH: 'stock',
+    njhouse_data.BK_CSV_PATH: 'bk',
+    njhouse_data.POLICY_CSV_PATH: 'policy',
+}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+class Inotify:
+    """
+    Linux inotify 的最小封装（通过 ctypes 调用 libc），只用于在目录有变化时提前唤醒；
+    具体哪些文件变化仍以扫描结果为准，事件丢失或合并都不影响结果
+    """
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        for directory in directories:
+            if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'无法监视目录 {directory}')
+
+    def wait(self, timeout):
+        """等待事件或超时，返回是否有事件；读出并丢弃所有已到达的事件"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+def open_inotify(directories):
+    """创建 inotify 监视，非 Linux 系统或创建失败时返回 None，改为定时扫描"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return Inotify(directories)
+    except (OSError, AttributeError) as e:
+        print(f"inotify 不可用，改为每 {WATCH_INTERVAL:g} 秒扫描一次: {e}")
+        return None
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def scan(picture_dirs):
+    """截图目录中的图片和各数据文件的 (修改时间, 大小)"""
+    state = {}
+    for directory in picture_dirs:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    for path in DATA_FILES:
+        state[path] = _stat(path)
+    return state
+
+class Watcher:
+    """
+    常驻进程的状态：上次处理后各文件的状态、README 中当前的图片
+    截图识别依赖 tesseract，导入失败时只监视数据文件
+    """
+
+    def __init__(self, picture_dirs=None, interval=WATCH_INTERVAL):
+        self.picture_dirs = [d for d in (picture_dirs or [njhouse_data.PICTURES_DIR]) if os.path.isdir(d)]
+        self.interval = interval
+        self.images = {}
+        self.ocr = None
+        try:
+            import nj_bk_daily
+            self.ocr = nj_bk_daily
+        except ImportError as e:
+            print(f"截图识别不可用，只监视数据文件: {e}")
+            self.picture_dirs = []
+        # 启动前已有的图片视为已处理
+        self.seen = scan(self.picture_dirs)
+        self.pending = {}
+
+    def warm_up(self):
+        """预先加载字体、绘图模块和数据集，之后的每次更新不再有这部分开销"""
+        start = time.perf_counter()
+        modules = []
+        if 'png' in daily_jobs.CHART_OUTPUT:
+            modules += ['plot_njhouse_stock', 'plot_njhouse_price_ratio']
+            importlib.import_module('plot_common').set_font()
+        if 'web' in daily_jobs.CHART_OUTPUT:
+            modules.append('plot_web')
+        for name in modules:
+            importlib.import_module(name)
+        njhouse_data.load_stock()
+        njhouse_data.load_bk()
+        njhouse_data.load_policy()
+        njhouse_data.load_bk_metrics()
+        print(f"预加载完成，用时 {time.perf_counter() - start:.2f} 秒")
+
+    def ingest_screenshots(self, image_paths):
+        """识别新截图，写入识别结果和绘图使用的贝壳数据，返回新增的天数"""
+        # 一次到达多张截图时先去重，每天只识别一张
+        if len(image_paths) > 1:
+            image_paths = self.ocr.intake_images(image_paths)
+        rows = self.ocr.ocr_rows(image_paths)
+        if not rows:
+            return 0
+        self.ocr.save_rows_to_csv(rows, self.ocr.OCR_CSV_PATH, columns=self.ocr.OCR_COLUMNS)
+        added = self.ocr.merge_into_bk_daily(rows)
+        print(f"识别出 {', '.join(row['日期'] for row in rows)} 的数据，贝壳数据新增 {added} 天")
+        return added
+
+    def refresh(self, changed):
+        """
+        按变化的数据类型（stock、bk、policy）只执行受影响的步骤：
+        挂牌数据变化时更新挂牌指标并重绘总房源图，贝壳数据变化时更新贝壳指标并重绘降涨比图，政策变化时重绘两张图
+        """
+        steps = {}
+        if 'stock' in changed:
+            steps['stock_metrics'] = (lambda: daily_jobs.update_stock_metrics(njhouse_stock.STOCK_CSV_PATH), [])
+        if 'bk' in changed:
+            steps['bk_metrics'] = (daily_jobs.update_bk_metrics, [])
+        metric_steps = list(steps)
+        # 有提醒时才发送通知，提醒写在通知正文中
+        alert_steps = []
+        for stream in ('stock', 'bk'):
+            if f'{stream}_metrics' in steps:
+                steps[f'{stream}_alerts'] = (lambda _, stream=stream: daily_jobs.check_alerts(stream), [f'{stream}_metrics'])
+                alert_steps.append(f'{stream}_alerts')
+        if alert_steps:
+            steps['notify'] = (lambda *alerts: daily_jobs.notify(*alerts) if any(alerts) else None, alert_steps)
+        if 'png' in daily_jobs.CHART_OUTPUT:
+            if changed & {'stock', 'policy'}:
+                steps['plot_stock'] = (lambda: daily_jobs.plot_stock(njhouse_stock.STOCK_CSV_PATH), [])
+            if changed & {'bk', 'policy'}:
+                steps['plot_bk'] = (daily_jobs.plot_bk, [name for name in ['bk_metrics'] if name in steps])
+        if 'web' in daily_jobs.CHART_OUTPUT:
+            steps['export_web'] = (lambda *_: daily_jobs.export_web(njhouse_stock.STOCK_CSV_PATH), metric_steps)
+
+        start = time.perf_counter()
+        results = run_pipeline(steps)
+        for chart in ('stock', 'bk'):
+            if f'plot_{chart}' in results:
+                self.images[chart] = results[f'plot_{chart}']
+        if any(f'plot_{chart}' in results for chart in ('stock', 'bk')) and len(self.images) == 2:
+            daily_jobs.update_readme(self.images['bk'], self.images['stock'])
+        print(f"更新完成（{', '.join(sorted(changed))}），用时 {time.perf_counter() - start:.2f} 秒")
+        return results
+
+    def _settled(self, state):
+        """返回已写完的新图片；刚修改或两次扫描之间仍在变化的图片留到下次"""
+        now = time.time_ns()
+        ready = []
+        for path, stat in state.items():
+            if path in DATA_FILES or stat is None or self.seen.get(path) == stat:
+                continue
+            if self.pending.get(path) == stat and now - stat[0] >= SETTLE_SECONDS * 1e9:
+                ready.append(path)
+                del self.pending[path]
+            else:
+                self.pending[path] = stat
+        return sorted(ready)
+
+    def poll(self):
+        """扫描一次并处理变化，返回是否还有未写完的图片"""
+        state = scan(self.picture_dirs)
+        images = self._settled(state)
+        if images:
+            print(f"\n新截图: {', '.join(os.path.basename(path) for path in images)}")
+            try:
+                self.ingest_screenshots(images)
+            except Exception as e:
+                print(f"截图处理失败: {e}")
+            for path in images:
+                self.seen[path] = state[path]
+        # 数据文件变化（包括刚写入的贝壳数据）在截图处理之后统一判断
+        changed = set()
+        for path, kind in DATA_FILES.items():
+            stat = _stat(path)
+            if stat != self.seen.get(path):
+                changed.add(kind)
+                self.seen[path] = stat
+        if changed:
+            print(f"\n数据文件变化: {', '.join(sorted(changed))}")
+            self.refresh(changed)
+        return bool(self.pending)
+
+    def run(self, initial=True):
+        self.warm_up()
+        if initial:
+            # 启动时完整更新一次，输出与数据一致，并记下 README 中的图片
+            self.refresh({'stock', 'bk', 'policy'})
+            self.seen.update({path: _stat(path) for path in DATA_FILES})
+        inotify = open_inotify(self.picture_dirs + [njhouse_data.DATA_DIR])
+        print(f"开始监视: {', '.join(self.picture_dirs + [njhouse_data.DATA_DIR])}"
+              f"（{'inotify' if inotify else '定时扫描'}），按 Ctrl+C 退出")
+        try:
+            waiting = False
+            while True:
+                timeout = SETTLE_SECONDS if waiting else (IDLE_INTERVAL if inotify else self.interval)
+                if inotify:
+                    inotify.wait(timeout)
+                else:
+                    time.sleep(timeout)
+                waiting = self.poll()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if inotify:
+                inotify.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='常驻监视截图和数据文件，增量更新数据和图表')
+    parser.add_argument('picture_dirs', nargs='*', help=f'截图目录，默认为 {njhouse_data.PICTURES_DIR}')
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help='没有 inotify 时的扫描间隔（秒）')
+    parser.add_argument('--no-initial', action='store_true', help='启动时不做完整更新')
+    args = parser.parse_args()
+    Watcher(args.picture_dirs, args.interval).run(initial=not args.no_initial)
@@ -0,0 +1,204 @@
+# 流水线性能记录：每个步骤的耗时、CPU 时间、进程内存峰值、进程读写字节数，以及 HTTP 请求延迟和图片大小
+# 每次运行追加若干行 JSON 到记录文件，可按时间绘制流水线性能变化
+# 用法: python pipeline_trace.py [记录文件]  绘制各步骤耗时随运行次数的变化
+
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from datetime import datetime, timezone
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+TRACE_PATH = os.getenv('PIPELINE_TRACE', os.path.join(script_dir, 'njhouse_stock_daily', 'pipeline_trace.jsonl'))
+PROFILE_DIR = os.path.join(script_dir, 'profiles')
+
+# 当前正在执行的步骤，HTTP 请求等事件据此归属到步骤
+current_stage = contextvars.ContextVar('current_stage', default=None)
+_active = None
+
+def _read_io(path):
+    """读取 /proc 中的读写字节数，非 Linux 系统返回 None"""
+    try:
+        with open(path) as f:
+            fields = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return None
+    return {key: int(fields[key]) for key in ('rchar', 'wchar', 'read_bytes', 'write_bytes') if key in fields}
+
+def _io_delta(before, after):
+    if before is None or after is None:
+        return {}
+    return {key: after[key] - before[key] for key in before if key in after}
+
+def peak_rss_kb():
+    """进程的内存峰值（KB），不支持的系统返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位是字节，Linux 是 KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def record(kind, **fields):
+    """记录一个事件（如 HTTP 请求、生成的图片），没有正在记录的流水线时不做任何事"""
+    tracer = _active
+    if tracer is not None:
+        tracer.emit(kind, stage=current_stage.get(), **fields)
+
+class Tracer:
+    """
+    记录一次流水线运行，所有记录在 close() 时一次性追加到记录文件
+    profile 为需要分析的步骤名集合（'all' 表示全部），profiler 为 'cprofile' 或 'pyinstrument'
+    """
+
+    def __init__(self, path=TRACE_PATH, profile=(), profiler='cprofile'):
+        self.path = path
+        self.run_id = os.urandom(6).hex()
+        self.profile = set(profile)
+        self.profiler = profiler
+        self.records = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._io_start = _read_io('/proc/self/io')
+        # 正在执行的步骤，及每个步骤执行期间同时执行过的其他步骤
+        self._running = set()
+        self._overlaps = {}
+
+    def emit(self, kind, **fields):
+        with self._lock:
+            self.records.append({'run': self.run_id, 'type': kind,
+                                 'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), **fields})
+
+    def __enter__(self):
+        global _active
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run_stage(self, name, func, *args):
+        """
+        在当前线程中执行一个步骤并记录；CPU 时间按执行步骤的线程统计
+        读写字节为整个进程在步骤执行期间的增量，包括步骤启动的工作线程（如抓取时 asyncio.to_thread 的线程）；
+        有依赖关系的步骤依次执行，互不依赖的步骤可能同时执行，其读写量会计入彼此，这些步骤记录在 overlapped 中
+        process_peak_rss_kb 为步骤结束时整个进程的内存峰值，不是该步骤单独的内存占用
+        """
+        token = current_stage.set(name)
+        with self._lock:
+            self._overlaps[name] = set(self._running)
+            for other in self._running:
+                self._overlaps[other].add(name)
+            self._running.add(name)
+        io_before = _read_io('/proc/self/io')
+        cpu_before = time.thread_time()
+        start = time.perf_counter()
+        status, error = 'ok', None
+        try:
+            if name in self.profile or 'all' in self.profile:
+                return self._profiled(name, func, *args)
+            return func(*args)
+        except Exception as e:
+            status, error = 'error', str(e)
+            raise
+        finally:
+            io_after = _read_io('/proc/self/io')
+            with self._lock:
+                self._running.discard(name)
+                overlapped = sorted(self._overlaps.pop(name))
+            self.emit('stage', stage=name, status=status, error=error,
+                      wall=time.perf_counter() - start,
+                      cpu=time.thread_time() - cpu_before,
+                      process_peak_rss_kb=peak_rss_kb(),
+                      overlapped=overlapped,
+                      **_io_delta(io_before, io_after))
+            current_stage.reset(token)
+
+    def _profiled(self, name, func, *args):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{name}")
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print('未安装 pyinstrument，改用 cProfile')
+            else:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    return func(*args)
+                finally:
+                    profiler.stop()
+                    with open(base + '.html', 'w', encoding='utf-8') as f:
+                        f.write(profiler.output_html())
+                    self.emit('profile', stage=name, path=base + '.html')
+
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args)
+        finally:
+            profiler.dump_stats(base + '.prof')
+            self.emit('profile', stage=name, path=base + '.prof')
+
+    def close(self):
+        global _active
+        if _active is self:
+            _active = None
+        stages = [r for r in self.records if r['type'] == 'stage']
+        self.emit('run', wall=time.perf_counter() - self._start,
+                  cpu=time.process_time() - self._cpu_start,
+                  peak_rss_kb=peak_rss_kb(),
+                  stages=len(stages),
+                  failed=[r['stage'] for r in stages if r['status'] != 'ok'],
+                  **_io_delta(self._io_start, _read_io('/proc/self/io')))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for item in self.records:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        print(f"性能记录已写入 {self.path}（运行 {self.run_id}，{len(stages)} 个步骤）")
+
+def load_trace(path=TRACE_PATH, kind='stage'):
+    """读取记录文件中某一类记录为 DataFrame"""
+    import pandas as pd
+    with open(path, encoding='utf-8') as f:
+        rows = [item for item in map(json.loads, f) if item['type'] == kind]
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df['time'] = pd.to_datetime(df['time'])
+    return df
+
+def plot_stage_history(path=TRACE_PATH, image_path=os.path.join(script_dir, 'plot_pngs', 'pipeline_trace.png')):
+    """按运行时间绘制各步骤的耗时"""
+    import plot_common
+    from matplotlib.figure import Figure
+    plot_common.set_font()
+    stages = load_trace(path)
+    if stages.empty:
+        print('没有性能记录')
+        return None
+    # 每次运行取第一个步骤的时间作为运行时间
+    stages['run_time'] = stages.groupby('run')['time'].transform('min')
+    wall = stages.pivot_table(index='run_time', columns='stage', values='wall', aggfunc='sum').sort_index()
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    for stage in wall.columns:
+        ax.plot(wall.index, wall[stage], marker='o', label=stage)
+    ax.set_ylabel('耗时（秒）')
+    ax.set_title('每日任务各步骤耗时', fontsize=14, pad=15)
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc='upper left')
+    fig.autofmt_xdate()
+    os.makedirs(os.path.dirname(os.path.abspath(image_path)), exist_ok=True)
+    fig.savefig(image_path, bbox_inches='tight')
+    print(f"图表已保存为 {image_path}")
+    return image_path
+
+if __name__ == "__main__":
+    trace_path = sys.argv[1] if len(sys.argv) > 1 else TRACE_PATH
+    plot_stage_history(trace_path)
@@ -0,0 +1,97 @@
+# 两个图表共用的绘制辅助函数
+
+import platform
+import functools
+import numpy as np
+import pandas as pd
+import matplotlib
+# 只输出图片，固定使用非交互式的 Agg 后端，避免探测图形界面后端
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
+
+@functools.lru_cache(maxsize=None)
+def set_font():
+    """根据操作系统设置合适的中文字体，每个进程只设置一次"""
+    system = platform.system()
+    if system == 'Darwin':  # macOS
+        matplotlib.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
+    elif system == 'Linux':  # GitHub Actions (Ubuntu)
+        matplotlib.rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'Noto Sans CJK JP', 'DejaVu Sans']
+    else:  # Windows
+        matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
+    
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    matplotlib.rcParams['font.family'] = 'sans-serif'
+
+def weekend_runs(dates):
+    """将周末日期合并为连续区间，返回 [(开始日期, 结束日期), ...]"""
+    dates = pd.Series(pd.to_datetime(dates)).sort_values()
+    weekend = dates[dates.dt.dayofweek >= 5].drop_duplicates()
+    if weekend.empty:
+        return []
+    # 与前一个周末日期相差超过一天时开始新的区间
+    new_run = weekend.diff().ne(pd.Timedelta(days=1))
+    run_id = new_run.cumsum()
+    grouped = weekend.groupby(run_id.to_numpy())
+    return list(zip(grouped.min(), grouped.max()))
+
+def shade_weekends(ax, dates, **kwargs):
+    """用一个集合对象绘制所有周末背景色带，每段前后各扩展半天"""
+    runs = weekend_runs(dates)
+    if not runs:
+        return None
+    starts = mdates.date2num([start - pd.Timedelta(hours=12) for start, _ in runs])
+    ends = mdates.date2num([end + pd.Timedelta(hours=12) for _, end in runs])
+    # x 为数据坐标，y 为坐标轴坐标，色带始终铺满整个高度
+    verts = np.stack([
+        np.column_stack([starts, np.zeros(len(runs))]),
+        np.column_stack([starts, np.ones(len(runs))]),
+        np.column_stack([ends, np.ones(len(runs))]),
+        np.column_stack([ends, np.zeros(len(runs))]),
+    ], axis=1)
+    collection = PolyCollection(verts, transform=ax.get_xaxis_transform(), linewidths=0, **kwargs)
+    ax.add_collection(collection, autolim=False)
+    return collection
+
+def annotate_policies(ax, df, policy_df, y_column, text_columns, max_labels=None):
+    """
+    一次合并找到政策日期对应的数据点，用一次 scatter 绘制所有政策标记
+    max_labels 不为空时只为最近的若干条政策添加说明文本，文本框的绘制耗时远高于数据点
+    """
+    points = pd.merge(
+        policy_df.assign(日期=pd.to_datetime(policy_df['日期']).astype('datetime64[ns]')),
+        df[['日期', y_column]].assign(日期=df['日期'].astype('datetime64[ns]')).drop_duplicates('日期'),
+        on='日期',
+        how='inner',
+    )
+    if points.empty:
+        return
+
+    ax.scatter(points['日期'], points[y_column],
+               marker='*',
+               s=200,  # 相当于markersize=15的效果
+               color='red',
+               zorder=5)
+
+    # 添加政策说明文本
+    if max_labels is not None:
+        points = points.sort_values('日期').tail(max_labels)
+    texts = points[text_columns].astype(str).agg('\n'.join, axis=1)
+    for date, y_value, text in zip(points['日期'], points[y_column], texts):
+        ax.annotate(text,
+                    xy=(date, y_value),
+                    xytext=(10, 10),
+                    textcoords='offset points',
+                    fontsize=8,
+                    bbox=dict(boxstyle='round,pad=0.5',
+                              fc='yellow',
+                              alpha=0.5),
+                    arrowprops=dict(arrowstyle='->'))
+
+def last_days(df, days):
+    """只保留最近 days 天（按最后一个日期计算）的数据，df 需已按日期升序"""
+    if df.empty:
+        return df
+    start = df['日期'].iloc[-1] - pd.Timedelta(days=days - 1)
+    return df[df['日期'] >= start]
@@ -0,0 +1,138 @@
+# 长时间序列的降采样：按时间跨度选择按日、按周、按月聚合，或保留极值的 LTTB 降采样
+# 数据直接以内存映射方式从列式存储读取，只绘制降采样后的点，绘图耗时不随历史数据增长
+
+import numpy as np
+import njhouse_store
+
+# 图中最多绘制的点数，超过时改用更粗的聚合粒度
+MAX_POINTS = 400
+# 各聚合粒度每个点代表的天数（按月为近似值，只用于选择粒度和柱宽）
+BIN_DAYS = {'daily': 1, 'weekly': 7, 'monthly': 30.44}
+LEVELS = list(BIN_DAYS) + ['lttb']
+
+def load_columns(store_dir, columns, window=None):
+    """
+    以内存映射方式读取日期和若干数值列，返回 (天数数组, {列名: float64 数组})，按日期升序
+    整数列的缺失值转为 NaN；window 为只读取最近多少天，只会访问列文件末尾的数据
+    """
+    schema = njhouse_store.load_schema(store_dir)
+    days = njhouse_store.read_column(store_dir, '日期', schema)
+    if len(days) > 1 and not np.all(days[1:] > days[:-1]):
+        # 乱序写入时才需要排序，此时整列读入内存
+        order = np.argsort(days, kind='stable')
+        days = np.asarray(days)[order]
+    else:
+        order = None
+    start = 0
+    if window and len(days):
+        start = int(np.searchsorted(days, days[-1] - (window - 1)))
+
+    values = {}
+    for column in columns:
+        raw = njhouse_store.read_column(store_dir, column, schema)
+        raw = raw[order] if order is not None else raw
+        raw = raw[start:]
+        data = raw.astype('float64')
+        if not np.issubdtype(raw.dtype, np.floating):
+            data[raw == njhouse_store.MISSING] = np.nan
+        values[column] = data
+    return np.asarray(days[start:], dtype='int64'), values
+
+def choose_level(span_days, max_points=MAX_POINTS):
+    """选择点数不超过 max_points 的最细聚合粒度，按月仍然太多时使用 LTTB"""
+    for level, bin_days in BIN_DAYS.items():
+        if span_days / bin_days <= max_points:
+            return level
+    return 'lttb'
+
+def bin_keys(days, level):
+    """每一天所属区间的起始日（1970-01-01 起的天数）：按周以周一为起点，按月以 1 日为起点"""
+    if level == 'daily':
+        return days
+    if level == 'weekly':
+        # 1970-01-01 是周四
+        return days - (days + 3) % 7
+    if level == 'monthly':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype('int64')
+    raise ValueError(f"未知的聚合粒度: {level}")
+
+def aggregate(days, values, level, how='mean'):
+    """
+    将升序的日序列按粒度聚合，返回 (区间起始日, 聚合值)，NaN 不参与计算
+    how 为 mean、sum、min 或 max，区间内全部缺失时结果为 NaN
+    """
+    if len(days) == 0:
+        return days, values
+    keys = bin_keys(days, level)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype('int64'), starts)
+    if how in ('mean', 'sum'):
+        result = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = result / counts
+    elif how == 'min':
+        result = np.fmin.reduceat(values, starts)
+    elif how == 'max':
+        result = np.fmax.reduceat(values, starts)
+    else:
+        raise ValueError(f"未知的聚合方式: {how}")
+    result[counts == 0] = np.nan
+    return keys[starts], result
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets 降采样，返回选中点的下标；首尾两点始终保留"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # 除首尾外的点平均分为 n_out - 2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # 下一个桶的平均点，最后一个桶使用末尾的点
+        if i < n_out - 3:
+            nxt_lo, nxt_hi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # 与上一个选中点、下一个桶平均点构成的三角形面积最大的点
+        area = np.abs((x[previous] - avg_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (avg_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def minmax_lttb(x, y, n_out, ratio=4):
+    """
+    保留极值的 LTTB：先在 n_out * ratio 个等长分段中各取最小、最大值点，再对这些点做 LTTB
+    全局最小值、最大值点始终保留（结果可能比 n_out 多两个点），缺失值不参与，返回选中点的下标（升序）
+    """
+    index = np.flatnonzero(~np.isnan(y))
+    if len(index) <= n_out:
+        return index
+    segments = np.array_split(np.arange(len(index)), min(n_out * ratio, len(index)))
+    candidates = {0, len(index) - 1}
+    for segment in segments:
+        values = y[index[segment]]
+        candidates.add(int(segment[np.argmin(values)]))
+        candidates.add(int(segment[np.argmax(values)]))
+    candidates = index[np.array(sorted(candidates))]
+    selected = candidates[lttb(x[candidates], y[candidates], n_out)]
+    return np.union1d(selected, [index[np.argmin(y[index])], index[np.argmax(y[index])]])
+
+def downsample(days, values, level='auto', max_points=MAX_POINTS, how='mean'):
+    """按粒度降采样一列，返回 (日期数组 datetime64[D], 值, 实际使用的粒度)"""
+    if level == 'auto':
+        level = choose_level(days[-1] - days[0] + 1 if len(days) else 0, max_points)
+    if level == 'lttb':
+        selected = minmax_lttb(days, values, max_points)
+        x, y = days[selected], values[selected]
+    else:
+        x, y = aggregate(days, values, level, how)
+    return x.astype('datetime64[D]'), y, level
@@ -1,73 +1,91 @@
 import pandas as pd
-import matplotlib.pyplot as plt
+import plot_common
+from matplotlib.figure import Figure
 from datetime import datetime
 import os
 import matplotlib as mpl
-import platform
+import plot_output
+import njhouse_data
+import njhouse_alerts
 
-# 切换到脚本所在目录
-script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
+# README 中使用的图片尺寸，分辨率默认使用 matplotlib 的设置
+DEFAULT_FIGSIZE = (12, 6)
 
-# 根据操作系统设置合适的中文字体
-def set_font():
-    system = platform.system()
-    if system == 'Darwin':  # macOS
-        mpl.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
-    elif system == 'Linux':  # GitHub Actions (Ubuntu)
-        mpl.rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'Noto Sans CJK JP', 'DejaVu Sans']
-    else:  # Windows
-        mpl.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-    
-    mpl.rcParams['axes.unicode_minus'] = False
-    mpl.rcParams['font.family'] = 'sans-serif'
+def render_settings(dpi=None, figsize=None):
+    """影响图片内容的绘图参数，用于图片命名和渲染缓存"""
+    plot_common.set_font()
+    return {
+        'figsize': tuple(figsize or DEFAULT_FIGSIZE),
+        'dpi': dpi or mpl.rcParams['savefig.dpi'],
+        'font': mpl.rcParams['font.sans-serif'],
+        'code': plot_output.source_fingerprint(__file__),
+    }
 
-def plot_price_change_ratio(csv_path):
+def plot_price_change_ratio(csv_path, df=None, policy_df=None, metrics_df=None, naming='timestamp', retention=None, window=None, dpi=None, figsize=None):
+    """
+    metrics_df 为派生指标表，未传入时读取 njhouse_data.BK_METRICS_CSV_PATH；
+    naming='hash' 时按数据与绘图参数的哈希命名图片，相同图片已存在则跳过绘制；
+    retention 为保留的同类图片数量，更早的图片会被删除；
+    window 为只绘制最近多少天，dpi、figsize 为输出分辨率和尺寸，非默认值时图片名中带有对应后缀
+    """
+    prefix = plot_output.variant_prefix('plot_njhouse_bk_daily', window, dpi,
+                                        figsize if figsize and tuple(figsize) != DEFAULT_FIGSIZE else None)
     # 设置字体
-    set_font()
+    plot_common.set_font()
     
-    # 读取房价数据
-    df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    # 读取房价数据，已由调用方读取时直接使用；数据集是共享的，复制一份再修改
+    if df is None:
+        df = njhouse_data.load_bk(csv_path)
+    df = df.copy()
     
     # 读取政策数据
-    try:
-        policy_df = pd.read_csv('njhouse_stock_daily/njhouse_policy.csv', encoding='utf-8-sig')
+    if policy_df is None:
+        policy_df = njhouse_data.load_policy()
+    has_policy_data = policy_df is not None
+    if has_policy_data:
+        policy_df = policy_df.copy()
         policy_df['日期'] = pd.to_datetime(policy_df['日期'])
-        has_policy_data = True
-    except FileNotFoundError:
-        print("政策数据文件不存在，将不显示政策信息")
-        has_policy_data = False
     
     # 将日期列转换为日期类型
     df['日期'] = pd.to_datetime(df['日期'])
     
     # 按日期排序
     df = df.sort_values('日期')
-    
-    # 计算降价/涨价比值
-    df['降价房源'] = pd.to_numeric(df['降价房源'], errors='coerce')
-    df['涨价房源'] = pd.to_numeric(df['涨价房源'], errors='coerce').replace(0, float('nan'))
-    df['价格变动比'] = df['降价房源'] / df['涨价房源']
-    
-    # 替换无穷大值为NaN，并填充NaN值为0，使用推荐的写法避免警告
-    df['价格变动比'] = df['价格变动比'].replace([float('inf'), -float('inf')], float('nan'))
+    if window:
+        df = plot_common.last_days(df, window)
+    
+    # 降涨比读取派生指标表（njhouse_metrics），指标表中还没有的日期再临时计算
+    if metrics_df is None:
+        metrics_df = njhouse_data.load_bk_metrics()
+    if metrics_df is not None:
+        df['价格变动比'] = df['日期'].map(metrics_df['价格变动比'])
+        pending = ~df['日期'].isin(metrics_df.index)
+    else:
+        df['价格变动比'] = float('nan')
+        pending = pd.Series(True, index=df.index)
+    if pending.any():
+        down = pd.to_numeric(df.loc[pending, '降价房源'], errors='coerce')
+        up = pd.to_numeric(df.loc[pending, '涨价房源'], errors='coerce').replace(0, float('nan'))
+        df.loc[pending, '价格变动比'] = (down / up).round(4)
+    
+    # 涨价房源为 0 等无法计算的日期显示为 0
     df['价格变动比'] = df['价格变动比'].fillna(0)
     
-    # 创建图表和第一个Y轴
-    fig, ax1 = plt.subplots(figsize=(12, 6))  # 调整图表大小
+    # 按内容命名时，相同数据和绘图参数的图片已存在则无需重新绘制
+    if naming == 'hash':
+        digest = plot_output.content_hash([df, policy_df if has_policy_data else None], render_settings(dpi, figsize))
+        image_path = plot_output.output_path(prefix, digest)
+        if os.path.exists(plot_output.resolve(image_path)):
+            plot_output.record_output(prefix, image_path, retention)
+            print(f"折线图已保存为 {image_path}")
+            return image_path
     
-    # 在创建图表之后，绘制主数据线之前添加周末背景
-    # 获取周末的日期
-    weekend_mask = df['日期'].dt.dayofweek.isin([5, 6])  # 5是周六，6是周日
-    weekend_dates = df[weekend_mask]['日期']
+    # 创建图表和第一个Y轴
+    fig = Figure(figsize=figsize or DEFAULT_FIGSIZE)  # 调整图表大小，不经过 pyplot，便于在多个线程中同时绘制
+    ax1 = fig.subplots()
     
-    # 为每个周末日期添加垂直的背景色带
-    for date in weekend_dates:
-        ax1.axvspan(date - pd.Timedelta(hours=12),  # 向左偏移12小时
-                   date + pd.Timedelta(hours=12),  # 向右偏移12小时
-                   alpha=0.2,
-                   color='lightgray',
-                   label='周末' if date == weekend_dates.iloc[0] else "")  # 只在图例中显示一次
+    # 在创建图表之后，绘制主数据线之前添加周末背景，连续的周末合并为一段色带
+    plot_common.shade_weekends(ax1, df['日期'], alpha=0.2, color='lightgray', label='周末')
     
     # 绘制主数据线（降涨比）
     line1 = ax1.plot(df['日期'], df['价格变动比'], 
@@ -78,13 +96,13 @@ def plot_price_change_ratio(csv_path):
              linewidth=1,
              label='降涨比')
     
-    # 添加比例10的红色参考线
-    ax1.axhline(y=10, 
+    # 添加提醒阈值的红色参考线
+    ax1.axhline(y=njhouse_alerts.PRICE_CHANGE_RATIO_LIMIT, 
                 color='red',
                 linestyle='--',
                 alpha=0.8,
                 linewidth=1,
-                label='警戒线(10)')
+                label=f'警戒线({njhouse_alerts.PRICE_CHANGE_RATIO_LIMIT})')
     
     # 创建第二个Y轴
     ax2 = ax1.twinx()
@@ -140,44 +158,22 @@ def plot_price_change_ratio(csv_path):
     
     # 调整x轴显示
     ax1.tick_params(axis='x', rotation=45)
-    plt.tight_layout()
+    fig.tight_layout()
     
     # 在图表上标注政策点
     if has_policy_data:
-        for idx, row in policy_df.iterrows():
-            # 找到政策日期对应的降涨比值
-            matching_data = df[df['日期'] == row['日期']]
-            if not matching_data.empty:
-                y_value = matching_data['价格变动比'].iloc[0]
-                
-                # 添加政策点标记
-                ax1.scatter(row['日期'], y_value, 
-                        marker='*',
-                        s=200,  # 相当于markersize=15
-                        color='red',
-                        zorder=5)
-                
-                # 添加政策说明文本
-                ax1.annotate(row['政策'],
-                            xy=(row['日期'], y_value),
-                            xytext=(10, 10),
-                            textcoords='offset points',
-                            fontsize=8,
-                            bbox=dict(boxstyle='round,pad=0.5',
-                                    fc='yellow',
-                                    alpha=0.5),
-                            arrowprops=dict(arrowstyle='->'))
-    
-    # 获取当前日期时间戳
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        plot_common.annotate_policies(ax1, df, policy_df, '价格变动比', ['政策'])
     
     # 确保目标目录存在
-    os.makedirs('plot_pngs', exist_ok=True)
+    os.makedirs(plot_output.resolve(plot_output.PLOT_DIR), exist_ok=True)
     
-    # 保存图片
-    image_path = f"plot_pngs/plot_njhouse_bk_daily_{timestamp}.png"
-    plt.savefig(image_path, bbox_inches='tight')
-    plt.close()
+    # 保存图片，默认以当前时间戳命名
+    if naming != 'hash':
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        image_path = f"{plot_output.PLOT_DIR}/{prefix}_{timestamp}.png"
+    fig.savefig(plot_output.resolve(image_path), bbox_inches='tight', dpi=dpi or mpl.rcParams['savefig.dpi'])
+    if naming == 'hash':
+        plot_output.record_output(prefix, image_path, retention)
     
     print(f"折线图已保存为 {image_path}")
     
@@ -185,7 +181,7 @@ def plot_price_change_ratio(csv_path):
     return image_path
 
 if __name__ == "__main__":
-    csv_path = "njhouse_stock_daily/njhouse_bk_daily.csv"
+    csv_path = njhouse_data.BK_CSV_PATH
     if os.path.exists(csv_path):
         plot_price_change_ratio(csv_path)
     else:
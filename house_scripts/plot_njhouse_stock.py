@@ -1,40 +1,57 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import plot_common
+from matplotlib.figure import Figure
 from datetime import datetime
 import os
 import matplotlib as mpl
-import platform
-
-# 切换到脚本所在目录
-script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
-
-# 根据操作系统设置合适的中文字体
-def set_font():
-    system = platform.system()
-    if system == 'Darwin':  # macOS
-        mpl.rcParams['font.sans-serif'] = ['PingFang SC', 'Heiti SC', 'Microsoft YaHei', 'Arial Unicode MS']
-    elif system == 'Linux':  # GitHub Actions (Ubuntu)
-        mpl.rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'Noto Sans CJK JP', 'DejaVu Sans']
-    else:  # Windows
-        mpl.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-    
-    mpl.rcParams['axes.unicode_minus'] = False
-    mpl.rcParams['font.family'] = 'sans-serif'
-
-def plot_total_listings(csv_path):
+import plot_output
+import njhouse_data
+import njhouse_stock
+import plot_downsample
+
+# README 中使用的图片尺寸和分辨率
+DEFAULT_FIGSIZE = (12, 6)
+DEFAULT_DPI = 300
+# 降采样绘图中点数不超过该值时才绘制数据点标记
+MARKER_MAX_POINTS = 120
+# 降采样绘图中只为最近的若干条政策添加说明文本，更早的政策只标记位置
+MAX_POLICY_LABELS = 12
+# 各粒度在标题和坐标轴标签中的名称
+LEVEL_NAMES = {'daily': '每日', 'weekly': '每周', 'monthly': '每月', 'lttb': '降采样'}
+
+def render_settings(dpi=None, figsize=None):
+    """影响图片内容的绘图参数，用于图片命名和渲染缓存"""
+    plot_common.set_font()
+    return {
+        'figsize': tuple(figsize or DEFAULT_FIGSIZE),
+        'dpi': dpi or DEFAULT_DPI,
+        'font': mpl.rcParams['font.sans-serif'],
+        'code': plot_output.source_fingerprint(__file__),
+    }
+
+def plot_total_listings(csv_path, df=None, policy_df=None, naming='timestamp', retention=None, window=None, dpi=None, figsize=None):
+    """
+    naming='hash' 时按数据与绘图参数的哈希命名图片，相同图片已存在则跳过绘制；
+    retention 为保留的同类图片数量，更早的图片会被删除；
+    window 为只绘制最近多少天，dpi、figsize 为输出分辨率和尺寸，非默认值时图片名中带有对应后缀
+    """
+    prefix = plot_output.variant_prefix('plot_njhouse_total_listings', window,
+                                        dpi if dpi != DEFAULT_DPI else None,
+                                        figsize if figsize and tuple(figsize) != DEFAULT_FIGSIZE else None)
     # 设置字体
-    set_font()
+    plot_common.set_font()
     
-    # 读取CSV文件
-    df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    # 读取CSV文件，已由调用方读取时直接使用；数据集是共享的，复制一份再修改
+    if df is None:
+        df = njhouse_data.load_stock(csv_path)
+    df = df.copy()
     
-    try:
-        policy_df = pd.read_csv('house_scripts/njhouse_stock_daily/njhouse_policy.csv', encoding='utf-8-sig')
-        has_policy_data = True
-    except FileNotFoundError:
-        print("政策数据文件不存在，将不显示政策信息")
-        has_policy_data = False
+    if policy_df is None:
+        policy_df = njhouse_data.load_policy()
+    has_policy_data = policy_df is not None
+    if has_policy_data:
+        policy_df = policy_df.copy()
     
     # 确保CSV数据类型正确
     # 确保日期列是datetime格式
@@ -48,19 +65,24 @@ def plot_total_listings(csv_path):
     
     # 按日期排序
     df = df.sort_values('日期')
+    if window:
+        df = plot_common.last_days(df, window)
+    
+    # 按内容命名时，相同数据和绘图参数的图片已存在则无需重新绘制
+    if naming == 'hash':
+        digest = plot_output.content_hash([df, policy_df if has_policy_data else None], render_settings(dpi, figsize))
+        image_path = plot_output.output_path(prefix, digest)
+        if os.path.exists(plot_output.resolve(image_path)):
+            plot_output.record_output(prefix, image_path, retention)
+            print(f"图表已保存为 {image_path}")
+            return image_path
     
-    # 创建图表和主Y轴
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    # 创建图表和主Y轴，不经过 pyplot，便于在多个线程中同时绘制
+    fig = Figure(figsize=figsize or DEFAULT_FIGSIZE)
+    ax1 = fig.subplots()
     
-    # 标记周末背景
-    weekend_mask = df['日期'].dt.dayofweek.isin([5, 6])  # 5是周六，6是周日
-    weekend_dates = df[weekend_mask]['日期']
-    for date in weekend_dates:
-        ax1.axvspan(date - pd.Timedelta(hours=12), 
-                   date + pd.Timedelta(hours=12),
-                   alpha=0.1,
-                   color='gray',
-                   label='周末' if date == weekend_dates.iloc[0] else "")
+    # 标记周末背景，连续的周末合并为一段色带
+    plot_common.shade_weekends(ax1, df['日期'], alpha=0.1, color='gray', label='周末')
     
     # 绘制总挂牌房源（折线图，主Y轴）
     color1 = 'tab:blue'
@@ -83,36 +105,10 @@ def plot_total_listings(csv_path):
         # 确保政策日期是datetime格式
         policy_df['日期'] = pd.to_datetime(policy_df['日期'])
         
-        for idx, row in policy_df.iterrows():
-            policy_date = row['日期']
-            
-            # 查找匹配的数据点
-            matching_data = df[df['日期'] == policy_date]
-            
-            if not matching_data.empty:
-                # 获取政策日期对应的总挂牌房源数据
-                y_value = matching_data['总挂牌房源'].iloc[0]
-                
-                # 使用日期和数值绘制标记点
-                ax1.scatter(policy_date, y_value,
-                          marker='*',
-                          s=200,  # 相当于markersize=15的效果
-                          color='red',
-                          zorder=5)
-                
-                # 添加政策说明文本
-                ax1.annotate(f"{row['政策']}\n{row['具体内容']}",
-                            xy=(policy_date, y_value),
-                            xytext=(10, 10),
-                            textcoords='offset points',
-                            fontsize=8,
-                            bbox=dict(boxstyle='round,pad=0.5',
-                                    fc='yellow',
-                                    alpha=0.5),
-                            arrowprops=dict(arrowstyle='->'))
+        plot_common.annotate_policies(ax1, df, policy_df, '总挂牌房源', ['政策', '具体内容'])
     
     # 设置标题
-    plt.title('南京房市数据统计', fontsize=14, pad=15)
+    ax1.set_title('南京房市数据统计', fontsize=14, pad=15)
     
     # 合并所有图例
     lines1, labels1 = ax1.get_legend_handles_labels()
@@ -120,7 +116,7 @@ def plot_total_listings(csv_path):
     ax1.legend(lines1 + [bars], labels1 + ['昨日住宅成交量'], loc='upper left')
     
     # 设置x轴日期格式
-    plt.gcf().autofmt_xdate()
+    fig.autofmt_xdate()
     
     # 添加水印
     ax1.text(0.5, 0.5, 'github.com/Channe/njhouse',
@@ -133,26 +129,137 @@ def plot_total_listings(csv_path):
              rotation=45)
     
     # 调整布局
-    plt.tight_layout()
-    
-    # 获取当前日期时间戳
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    fig.tight_layout()
     
     # 确保目标目录存在
-    os.makedirs('plot_pngs', exist_ok=True)
+    os.makedirs(plot_output.resolve(plot_output.PLOT_DIR), exist_ok=True)
     
-    # 保存图片
-    image_path = f"plot_pngs/plot_njhouse_total_listings_{timestamp}.png"
-    plt.savefig(image_path, bbox_inches='tight', dpi=300)
-    plt.close()
+    # 保存图片，默认以当前时间戳命名
+    if naming != 'hash':
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        image_path = f"{plot_output.PLOT_DIR}/{prefix}_{timestamp}.png"
+    fig.savefig(plot_output.resolve(image_path), bbox_inches='tight', dpi=dpi or DEFAULT_DPI)
+    if naming == 'hash':
+        plot_output.record_output(prefix, image_path, retention)
     
     print(f"图表已保存为 {image_path}")
     
     # 返回生成的文件名，供 daily_jobs.py 使用
     return image_path
 
+def _snap_policies(policy_df, x, last_day):
+    """
+    将政策日期对齐到不晚于它的最近一个绘制点，超出数据范围的政策不标注
+    按周、按月聚合时 x 为各区间的起始日，数据范围的终点为最后一天的数据 last_day，不是最后一个区间的起始日
+    """
+    policy_days = pd.to_datetime(policy_df['日期']).to_numpy().astype('datetime64[D]')
+    index = np.searchsorted(x, policy_days, side='right') - 1
+    keep = (index >= 0) & (policy_days <= np.asarray(last_day).astype('datetime64[D]'))
+    return policy_df[keep].assign(日期=pd.to_datetime(x[index[keep]]))
+
+def plot_total_listings_binned(store_dir=None, policy_df=None, naming='timestamp', retention=None, window=None, dpi=None, figsize=None,
+                               level='auto', max_points=plot_downsample.MAX_POINTS):
+    """
+    长时间序列版本：从列式存储以内存映射方式读取数据，按时间跨度聚合后只绘制降采样后的点
+    level 为 auto、daily、weekly、monthly 或 lttb；按周、按月时总挂牌房源绘制平均值和最小、最大值区间，
+    成交量为区间内合计；lttb 时总挂牌房源为保留极值的降采样，成交量按月合计
+    """
+    store_dir = store_dir or njhouse_stock.STOCK_STORE_DIR
+    prefix = plot_output.variant_prefix(f'plot_njhouse_total_listings_{level}', window,
+                                        dpi if dpi != DEFAULT_DPI else None,
+                                        figsize if figsize and tuple(figsize) != DEFAULT_FIGSIZE else None)
+    plot_common.set_font()
+
+    days, values = plot_downsample.load_columns(store_dir, ['总挂牌房源', '昨日住宅成交量'], window)
+    if len(days) == 0:
+        print(f"存储中没有数据: {store_dir}")
+        return None
+    x, total, used_level = plot_downsample.downsample(days, values['总挂牌房源'], level, max_points)
+    bar_level = used_level if used_level != 'lttb' else 'monthly'
+    bar_x, volume = plot_downsample.aggregate(days, np.nan_to_num(values['昨日住宅成交量']), bar_level, 'sum')
+    bar_x = bar_x.astype('datetime64[D]')
+    band = None
+    if used_level in ('weekly', 'monthly'):
+        _, low = plot_downsample.aggregate(days, values['总挂牌房源'], used_level, 'min')
+        _, high = plot_downsample.aggregate(days, values['总挂牌房源'], used_level, 'max')
+        band = low, high
+
+    if policy_df is None:
+        policy_df = njhouse_data.load_policy()
+    has_policy_data = policy_df is not None and len(x) > 0
+    if has_policy_data:
+        policy_df = _snap_policies(policy_df, x, days[-1])
+    points = pd.DataFrame({'日期': pd.to_datetime(x), '总挂牌房源': total})
+
+    settings = {**render_settings(dpi, figsize), 'level': level, 'max_points': max_points}
+    if naming == 'hash':
+        frames = [points, pd.DataFrame({'日期': bar_x, '成交量': volume}), policy_df if has_policy_data else None]
+        digest = plot_output.content_hash(frames, settings)
+        image_path = plot_output.output_path(prefix, digest)
+        if os.path.exists(plot_output.resolve(image_path)):
+            plot_output.record_output(prefix, image_path, retention)
+            print(f"图表已保存为 {image_path}")
+            return image_path
+
+    fig = Figure(figsize=figsize or DEFAULT_FIGSIZE)
+    ax1 = fig.subplots()
+    level_name = LEVEL_NAMES[used_level]
+
+    # 按日绘制时才标记周末，聚合后的点跨越多天
+    if used_level == 'daily':
+        plot_common.shade_weekends(ax1, points['日期'], alpha=0.1, color='gray', label='周末')
+
+    color1 = 'tab:blue'
+    ax1.grid(True, alpha=0.3)
+    ax1.set_xlabel('日期')
+    ax1.set_ylabel('总挂牌房源', color=color1)
+    marker = 'o' if len(x) <= MARKER_MAX_POINTS else None
+    ax1.plot(points['日期'], total, color=color1, marker=marker, linestyle='-',
+             label='总挂牌房源' if used_level in ('daily', 'lttb') else f'总挂牌房源（{level_name}平均）')
+    if band is not None:
+        ax1.fill_between(points['日期'], band[0], band[1], color=color1, alpha=0.15, linewidth=0, label='最小值至最大值')
+    ax1.tick_params(axis='y', labelcolor=color1)
+
+    ax2 = ax1.twinx()
+    color2 = 'tab:red'
+    volume_label = '昨日住宅成交量' if bar_level == 'daily' else f'住宅成交量（{LEVEL_NAMES[bar_level]}合计）'
+    ax2.set_ylabel(volume_label, color=color2)
+    # 柱子从区间起始日开始，宽度为区间长度
+    bar_width = plot_downsample.BIN_DAYS[bar_level] * 0.8
+    bars = ax2.bar(pd.to_datetime(bar_x), volume, width=bar_width, align='edge' if bar_level != 'daily' else 'center',
+                   alpha=0.3, color=color2, label=volume_label)
+    ax2.tick_params(axis='y', labelcolor=color2)
+
+    if has_policy_data:
+        plot_common.annotate_policies(ax1, points, policy_df, '总挂牌房源', ['政策', '具体内容'], MAX_POLICY_LABELS)
+
+    ax1.set_title(f'南京房市数据统计（{level_name}）', fontsize=14, pad=15)
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    ax1.legend(lines1 + [bars], labels1 + [volume_label], loc='upper left')
+    fig.autofmt_xdate()
+    ax1.text(0.5, 0.5, 'github.com/Channe/njhouse',
+             fontsize=40,
+             color='gray',
+             alpha=0.2,
+             ha='center',
+             va='center',
+             transform=ax1.transAxes,
+             rotation=45)
+    fig.tight_layout()
+
+    os.makedirs(plot_output.resolve(plot_output.PLOT_DIR), exist_ok=True)
+    if naming != 'hash':
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        image_path = f"{plot_output.PLOT_DIR}/{prefix}_{timestamp}.png"
+    fig.savefig(plot_output.resolve(image_path), bbox_inches='tight', dpi=dpi or DEFAULT_DPI)
+    if naming == 'hash':
+        plot_output.record_output(prefix, image_path, retention)
+
+    print(f"图表已保存为 {image_path}")
+    return image_path
+
 if __name__ == "__main__":
-    csv_path = 'njhouse_stock_daily/njhouse_stock_daily.csv'
+    csv_path = njhouse_data.STOCK_CSV_PATH
     if os.path.exists(csv_path):
         plot_total_listings(csv_path)
     else:
@@ -0,0 +1,143 @@
+# 图表输出命名与清理：按输入数据和绘图参数的哈希命名图片，并只保留最近的若干张
+
+import os
+import re
+import json
+import hashlib
+import threading
+
+# 图片路径以 plot_pngs/xxx.png 的相对形式记录在清单和 README 中，读写文件时相对于 OUTPUT_ROOT 解析，与当前目录无关
+OUTPUT_ROOT = os.path.dirname(os.path.abspath(__file__))
+PLOT_DIR = 'plot_pngs'
+# 记录每类图表的输出顺序（最新的在最后），清理时以此为准，不依赖文件修改时间
+MANIFEST_PATH = os.path.join(PLOT_DIR, 'manifest.json')
+
+# 两个图表可能在不同线程中同时写清单
+_manifest_lock = threading.Lock()
+
+def resolve(path):
+    """将记录的相对路径转为实际读写的路径"""
+    return os.path.join(OUTPUT_ROOT, path)
+
+def source_fingerprint(path):
+    """绘图代码的哈希，修改绘图代码后旧图片不再命中"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def content_hash(frames, settings):
+    """计算若干 DataFrame 与绘图参数的哈希，返回前 12 位"""
+    import pandas as pd
+    h = hashlib.sha256()
+    for df in frames:
+        if df is None:
+            h.update(b'none')
+            continue
+        h.update(json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    h.update(json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()[:12]
+
+def variant_prefix(prefix, window=None, dpi=None, figsize=None):
+    """同一图表的不同版本（时间范围、分辨率、尺寸）使用不同的文件名前缀，各自保留和清理"""
+    if window:
+        prefix += f"_{window}d"
+    if dpi:
+        prefix += f"_{dpi}dpi"
+    if figsize:
+        prefix += f"_{figsize[0]:g}x{figsize[1]:g}"
+    return prefix
+
+def _is_output(prefix, name):
+    # 只匹配 前缀_哈希 或 前缀_时间戳，其他版本的图片（前缀更长）不算在内
+    return re.fullmatch(re.escape(prefix) + r'_([0-9a-f]{12}|\d{8}_\d{6})\.png', name) is not None
+
+def output_path(prefix, digest):
+    return f"{PLOT_DIR}/{prefix}_{digest}.png"
+
+def _load_manifest():
+    try:
+        with open(resolve(MANIFEST_PATH), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# 不为 None 时 record_output 只记录到该列表，由调用方稍后统一写入清单（用于多进程绘图）
+deferred_records = None
+
+def record_output(prefix, image_path, retention=None):
+    """将图片记为该类图表的最新输出，retention 不为空时删除更早的图片"""
+    if deferred_records is not None:
+        deferred_records.append((prefix, image_path, retention))
+        return
+    with _manifest_lock:
+        manifest = _load_manifest()
+        if prefix not in manifest:
+            # 首次使用时，已有的按时间戳命名的图片按文件名排序即为生成顺序
+            manifest[prefix] = sorted(f"{PLOT_DIR}/{name}" for name in os.listdir(resolve(PLOT_DIR))
+                                      if _is_output(prefix, name))
+        history = [p for p in manifest[prefix] if p != image_path]
+        history.append(image_path)
+
+        if retention is not None:
+            history = history[-max(retention, 1):]
+            kept = set(history)
+            # 清单之外的同类图片（包括旧的按时间戳命名的图片）一并删除
+            for name in os.listdir(resolve(PLOT_DIR)):
+                path = f"{PLOT_DIR}/{name}"
+                if _is_output(prefix, name) and path not in kept:
+                    os.remove(resolve(path))
+                    print(f"已删除过期图片 {path}")
+
+        manifest[prefix] = history
+        os.makedirs(resolve(PLOT_DIR), exist_ok=True)
+        with open(resolve(MANIFEST_PATH), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+# 渲染缓存：以输入文件内容和绘图参数为键，命中时无需读取数据和绘图
+RENDER_CACHE_PATH = os.path.join(PLOT_DIR, 'render_cache.json')
+# 本进程内各图表的缓存命中情况，供 daily_jobs 汇总
+render_stats = {}
+
+def render_cache_key(input_paths, settings):
+    """根据输入文件内容与绘图参数计算缓存键，不存在的文件按空内容处理"""
+    h = hashlib.sha256()
+    for path in input_paths:
+        # 只取文件名，绝对路径和相对路径得到相同的键
+        h.update(os.path.basename(path).encode('utf-8'))
+        try:
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        except FileNotFoundError:
+            h.update(b'missing')
+    h.update(json.dumps(settings, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+def cached_render(chart, input_paths, settings, render):
+    """缓存命中且图片仍存在时直接返回图片路径，否则调用 render() 绘制并记录结果"""
+    key = render_cache_key(input_paths, settings)
+    with _manifest_lock:
+        try:
+            with open(resolve(RENDER_CACHE_PATH), encoding='utf-8') as f:
+                entry = json.load(f).get(chart)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+
+    if entry and entry['key'] == key and os.path.exists(resolve(entry['image_path'])):
+        render_stats[chart] = 'hit'
+        print(f"{chart} 渲染缓存命中: {entry['image_path']}")
+        return entry['image_path']
+
+    render_stats[chart] = 'miss'
+    image_path = render()
+
+    with _manifest_lock:
+        try:
+            with open(resolve(RENDER_CACHE_PATH), encoding='utf-8') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache = {}
+        cache[chart] = {'key': key, 'image_path': image_path}
+        os.makedirs(resolve(PLOT_DIR), exist_ok=True)
+        with open(resolve(RENDER_CACHE_PATH), 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    return image_path
@@ -0,0 +1,107 @@
+# 批量绘图：按图表规格（图表类型、时间范围、分辨率、尺寸）在常驻的进程池中并行绘制多个版本
+# 用法: python plot_render.py [--windows 0,90,30] [--dpis 100,300] [--workers N]
+
+import io
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import plot_output
+import njhouse_data
+import njhouse_stock
+
+# window 为最近多少天，None 为全部数据；dpi、figsize 为 None 时使用图表的默认值
+ChartSpec = namedtuple('ChartSpec', ['chart', 'window', 'dpi', 'figsize'], defaults=(None, None, None))
+
+# 图表类型: (模块, 绘图函数, 数据文件)
+CHARTS = {
+    'total_listings': ('plot_njhouse_stock', 'plot_total_listings', njhouse_data.STOCK_CSV_PATH),
+    'price_ratio': ('plot_njhouse_price_ratio', 'plot_price_change_ratio', njhouse_data.BK_CSV_PATH),
+    # 长时间序列版本，从列式存储读取并按时间跨度自动聚合
+    'total_listings_binned': ('plot_njhouse_stock', 'plot_total_listings_binned', njhouse_stock.STOCK_STORE_DIR),
+}
+
+# 全部历史、最近 90 天、最近 30 天，网页和打印两种分辨率
+DEFAULT_CHARTS = ['total_listings', 'price_ratio']
+DEFAULT_SPECS = [ChartSpec(chart, window, dpi)
+                 for chart in DEFAULT_CHARTS
+                 for window in (None, 90, 30)
+                 for dpi in (100, 300)]
+
+_pool = None
+_pool_workers = None
+
+def _init_worker():
+    """工作进程启动时完成一次性的初始化：Agg 后端、绘图模块、中文字体和字体缓存"""
+    import importlib
+    import plot_common
+    from matplotlib.figure import Figure
+    plot_common.set_font()
+    for module_name, _, _ in CHARTS.values():
+        importlib.import_module(module_name)
+    # 先画一张带中文的小图，字体查找结果会被缓存，之后的绘图不再重复查找
+    fig = Figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, '南京房市 0123456789')
+    fig.savefig(io.BytesIO(), format='png')
+    # 图片清单由主进程统一写入，避免多个进程同时写同一个文件
+    plot_output.deferred_records = []
+
+def _render(spec, naming, retention):
+    import importlib
+    module_name, func_name, csv_path = CHARTS[spec.chart]
+    plot = getattr(importlib.import_module(module_name), func_name)
+    image_path = plot(csv_path, naming=naming, retention=retention,
+                      window=spec.window, dpi=spec.dpi, figsize=spec.figsize)
+    records = list(plot_output.deferred_records)
+    plot_output.deferred_records.clear()
+    return image_path, records
+
+def get_pool(max_workers=None):
+    """返回常驻的进程池，工作进程在多次 render_charts 调用之间复用"""
+    global _pool, _pool_workers
+    if _pool is None or max_workers != _pool_workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+        _pool_workers = max_workers
+    return _pool
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+def render_charts(specs=DEFAULT_SPECS, max_workers=None, naming='hash', retention=None):
+    """并行绘制所有规格的图表，返回 {规格: 图片路径或异常}，顺序与 specs 相同"""
+    pool = get_pool(max_workers)
+    futures = [(spec, pool.submit(_render, spec, naming, retention)) for spec in specs]
+    results = {}
+    for spec, future in futures:
+        try:
+            image_path, records = future.result()
+        except Exception as e:
+            print(f"{spec} 绘制失败: {str(e)}")
+            results[spec] = e
+            continue
+        for record in records:
+            plot_output.record_output(*record)
+        results[spec] = image_path
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='并行绘制多个版本的图表')
+    parser.add_argument('--charts', default=','.join(DEFAULT_CHARTS), help=f"图表类型，逗号分隔，可选: {','.join(CHARTS)}")
+    parser.add_argument('--windows', default='0,90,30', help='最近多少天，0 为全部数据，逗号分隔')
+    parser.add_argument('--dpis', default='100,300', help='分辨率，逗号分隔')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认等于 CPU 核数')
+    parser.add_argument('--retention', type=int, default=None, help='每个版本保留的图片数量')
+    args = parser.parse_args()
+
+    specs = [ChartSpec(chart, int(window) or None, int(dpi))
+             for chart in args.charts.split(',')
+             for window in args.windows.split(',')
+             for dpi in args.dpis.split(',')]
+    try:
+        for spec, result in render_charts(specs, args.workers, retention=args.retention).items():
+            print(f"{spec.chart} window={spec.window} dpi={spec.dpi}: {result}")
+    finally:
+        shutdown_pool()
@@ -0,0 +1,113 @@
+# 网页版图表：将数据预先按日、周、月聚合后导出为一个精简的 JSON 文件，由 web/index.html 在浏览器中绘制 SVG，支持缩放
+# 每天只增加几 KB 数据，不需要 matplotlib；本地查看: cd web && python -m http.server，然后打开 http://localhost:8000
+# 用法: python plot_web.py
+
+import os
+import json
+import numpy as np
+import njhouse_data
+import njhouse_stock
+import njhouse_alerts
+import plot_downsample
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+WEB_DIR = os.path.join(script_dir, 'web')
+BUNDLE_PATH = os.path.join(WEB_DIR, 'njhouse_bundle.json')
+BUNDLE_VERSION = 1
+# 网页中可选的聚合粒度，与 plot_downsample 一致
+WEB_LEVELS = ['daily', 'weekly', 'monthly']
+
+def _values(values, digits):
+    # NaN 写为 null；保留的小数位数为 0 时写为整数，减小文件体积
+    if digits == 0:
+        return [None if np.isnan(v) else int(round(v)) for v in values.tolist()]
+    return [None if np.isnan(v) else round(v, digits) for v in values.tolist()]
+
+def series_levels(days, columns):
+    """
+    将升序的日序列按各粒度聚合
+    columns: {列名: (值数组, 聚合方式, 小数位数)}；按平均值聚合的列在按周、按月时另外给出最小值和最大值
+    返回 {粒度: {'x': 区间起始日（1970-01-01 起的天数）, 列名: 值, ...}}
+    """
+    levels = {}
+    for level in WEB_LEVELS:
+        data = {}
+        for column, (values, how, digits) in columns.items():
+            x, aggregated = plot_downsample.aggregate(days, values, level, how)
+            data['x'] = x.tolist()
+            data[column] = _values(aggregated, digits)
+            if how == 'mean' and level != 'daily':
+                data[f'{column}_min'] = _values(plot_downsample.aggregate(days, values, level, 'min')[1], digits)
+                data[f'{column}_max'] = _values(plot_downsample.aggregate(days, values, level, 'max')[1], digits)
+        levels[level] = data
+    return levels
+
+def _frame_days(df):
+    return df['日期'].to_numpy().astype('datetime64[D]').astype('int64')
+
+def build_bundle(stock_store_dir=None, bk_df=None, bk_metrics_df=None, policy_df=None):
+    """生成网页使用的数据，各参数为空时读取仓库中的数据"""
+    stock_store_dir = stock_store_dir or njhouse_stock.STOCK_STORE_DIR
+    days, values = plot_downsample.load_columns(stock_store_dir, ['总挂牌房源', '昨日住宅成交量'])
+    stock = {
+        'title': '南京房地产每日挂牌总量、成交量',
+        'line': '总挂牌房源',
+        'bar': '昨日住宅成交量',
+        'levels': series_levels(days, {
+            '总挂牌房源': (values['总挂牌房源'], 'mean', 0),
+            '昨日住宅成交量': (np.nan_to_num(values['昨日住宅成交量']), 'sum', 0),
+        }),
+    }
+
+    if bk_df is None:
+        bk_df = njhouse_data.load_bk()
+    if bk_metrics_df is None:
+        bk_metrics_df = njhouse_data.load_bk_metrics()
+    bk_days = _frame_days(bk_df)
+    ratio = np.full(len(bk_df), np.nan)
+    if bk_metrics_df is not None:
+        ratio = bk_df['日期'].map(bk_metrics_df['价格变动比']).to_numpy(dtype='float64')
+    bk = {
+        'title': '南京二手房降涨比与成交量',
+        'line': '价格变动比',
+        'bar': '成交量',
+        'limit': njhouse_alerts.PRICE_CHANGE_RATIO_LIMIT,
+        'levels': series_levels(bk_days, {
+            '价格变动比': (ratio, 'mean', 2),
+            '成交量': (np.nan_to_num(bk_df['成交量'].to_numpy(dtype='float64')), 'sum', 0),
+        }),
+    }
+
+    if policy_df is None:
+        policy_df = njhouse_data.load_policy()
+    policies = []
+    if policy_df is not None:
+        policies = [[int(day), str(name), str(detail)]
+                    for day, name, detail in zip(_frame_days(policy_df), policy_df['政策'], policy_df['具体内容'])]
+
+    # 不写入生成时间，数据不变时文件内容不变，不会产生多余的提交
+    return {
+        'version': BUNDLE_VERSION,
+        'last_date': str(np.datetime64(int(max(days[-1] if len(days) else 0, bk_days[-1] if len(bk_days) else 0)), 'D')),
+        'series': {'stock': stock, 'bk': bk},
+        'policies': policies,
+    }
+
+def export_bundle(path=BUNDLE_PATH, **kwargs):
+    """写入网页数据文件，内容未变化时不重写，返回文件路径"""
+    content = json.dumps(build_bundle(**kwargs), ensure_ascii=False, separators=(',', ':'))
+    try:
+        with open(path, encoding='utf-8') as f:
+            if f.read() == content:
+                print(f"网页数据未变化: {path}")
+                return path
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print(f"网页数据已保存为 {path}（{len(content.encode('utf-8')) / 1024:.1f} KB）")
+    return path
+
+if __name__ == "__main__":
+    export_bundle()
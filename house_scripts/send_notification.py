@@ -1,41 +1,89 @@
 import os
-import requests
+import re
+import time
+import random
+import threading
+import contextvars
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+import pipeline_trace
 
-# 切换到脚本所在目录
-script_dir = os.path.dirname(os.path.abspath(__file__))
-os.chdir(script_dir)
+BARK_SERVER = os.getenv('BARK_SERVER', 'https://api.day.app')
+DEFAULT_TITLE = '南京房产每日数据'
+DEFAULT_URL = 'https://github.com/Channe/njhouse'
+# 单个请求的超时（秒）、最大重试次数和并发数
+REQUEST_TIMEOUT = 5
+MAX_RETRIES = 2
+MAX_WORKERS = 8
 
-def send_notification():
-    # 获取环境变量中的密钥
+def load_recipients():
+    """
+    读取所有接收人的 Bark 密钥：
+    BARK_SECRET_KEYS 中以逗号分隔的多个密钥，以及所有以 BARK_SECRET_KEY 开头的环境变量
+    """
     keys = []
-    if os.getenv('BARK_SECRET_KEY'):
-        keys.append(os.getenv('BARK_SECRET_KEY'))
-    if os.getenv('BARK_SECRET_KEY_TINA'):
-        keys.append(os.getenv('BARK_SECRET_KEY_TINA'))
-    
-    if not keys:
-        print("Error: No BARK keys found in environment variables")
-        return
-    
-    # 使用 requests.Session
-    session = requests.Session()
-    
-    # 发送请求到所有密钥
-    for key in keys:
-        # 构建请求的 URL
-        url = f"https://api.day.app/{key}/南京房产每日数据?url=https://github.com/Channe/njhouse"
-        
-        # 发送请求
+    for key in os.getenv('BARK_SECRET_KEYS', '').split(','):
+        if key.strip():
+            keys.append(key.strip())
+    for name in sorted(os.environ):
+        if re.fullmatch(r'BARK_SECRET_KEY(_\w+)?', name) and os.environ[name].strip():
+            keys.append(os.environ[name].strip())
+    # 去重并保持顺序
+    return list(dict.fromkeys(keys))
+
+def _send_one(session, key, title, body, url):
+    """向单个接收人发送，失败时带随机抖动重试，返回发送结果和耗时"""
+    import requests
+    path = f"{quote(title, safe='')}/{quote(body, safe='')}" if body else quote(title, safe='')
+    request_url = f"{BARK_SERVER}/{key}/{path}"
+    start = time.perf_counter()
+    error = None
+    for attempt in range(MAX_RETRIES + 1):
         try:
-            response = session.get(url)
+            response = session.get(request_url, params={'url': url}, timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
-                print(f"Notification sent successfully for key: {key[:5]}...")
-            else:
-                print(f"Failed to send notification for key: {key[:5]}... Status code: {response.status_code}")
+                return {'key': key[:5], 'ok': True, 'attempts': attempt + 1,
+                        'latency': time.perf_counter() - start}
+            error = f"Status code: {response.status_code}"
         except requests.RequestException as e:
-            print(f"Error sending notification for key: {key[:5]}... Error: {e}")
-    
-    session.close()
+            error = str(e)
+        if attempt < MAX_RETRIES:
+            # 指数退避加随机抖动，避免所有接收人同时重试
+            time.sleep((2 ** attempt) * 0.5 + random.uniform(0, 0.5))
+    return {'key': key[:5], 'ok': False, 'attempts': MAX_RETRIES + 1,
+            'latency': time.perf_counter() - start, 'error': error}
+
+def send_notification(title=DEFAULT_TITLE, body=None, url=DEFAULT_URL):
+    """并发发送给所有接收人，返回每个接收人的发送结果"""
+    keys = load_recipients()
+    if not keys:
+        print("Error: No BARK keys found in environment variables")
+        return []
+
+    # 使用 requests.Session 复用连接；requests 只在真正发送时导入
+    import requests
+    session = requests.Session()
+    try:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(keys))) as executor:
+            results = list(executor.map(lambda key: _send_one(session, key, title, body, url), keys))
+    finally:
+        session.close()
+
+    for result in results:
+        pipeline_trace.record('bark', **result)
+        if result['ok']:
+            print(f"Notification sent successfully for key: {result['key']}... ({result['latency'] * 1000:.0f} ms)")
+        else:
+            print(f"Failed to send notification for key: {result['key']}... {result['error']} ({result['latency'] * 1000:.0f} ms)")
+    return results
+
+def send_notification_async(title=DEFAULT_TITLE, body=None, url=DEFAULT_URL):
+    """在后台线程中发送，立即返回线程对象，调用方可在退出前有限时地等待"""
+    # 沿用调用方的上下文，性能记录中的发送结果归属到发起通知的步骤
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(send_notification, title, body, url), daemon=True)
+    thread.start()
+    return thread
 
 if __name__ == "__main__":
-    send_notification()
\ No newline at end of file
+    send_notification()